@@ -0,0 +1,113 @@
+"""
+
+    Benchmark of the overlapped article download and summarization stages in
+    rssbriefing.briefing_model.summarization.
+
+    The articles are served by a local HTTP stand-in with an artificial latency per request. The inference is
+    emulated by a fixed sleep per batch, which like a torch forward pass releases the GIL, so that the benchmark
+    measures the pipeline and not the model. The sequential baseline downloads each article right before its
+    inference, like the former get_summary(). The pipelined run downloads in worker threads while the main thread
+    "summarizes" windows of downloaded articles, like enrich_with_summary().
+
+    Run from the repository root:
+        python -m benchmarks.bench_article_pipeline --articles 64 --delay 0.3 --inference 0.5
+
+"""
+import argparse
+import time
+
+from flask import Flask
+
+from benchmarks.http_stand_in import start_server
+from rssbriefing.briefing_model.configs import SUMMARIZATION_BATCH_SIZE, SUMMARIZATION_WINDOW
+from rssbriefing.briefing_model.summarization import download_articles, get_article_text
+
+PARAGRAPH = ("The central bank kept its benchmark interest rate unchanged on Wednesday and signalled that it would "
+             "keep supporting the economy as long as the recovery from the pandemic remains uneven across sectors. ")
+
+
+def article_body(nr_paragraphs=12):
+    paragraphs = ''.join(f'<p>{PARAGRAPH * 3}</p>\n' for _ in range(nr_paragraphs))
+
+    return f"""<!DOCTYPE html>
+<html>
+<head><title>Central bank holds rates steady</title></head>
+<body>
+<article>
+<h1>Central bank holds rates steady</h1>
+{paragraphs}
+</article>
+</body>
+</html>""".encode('utf-8')
+
+
+def emulate_inference(texts, seconds_per_batch):
+    for _ in range(0, len(texts), SUMMARIZATION_BATCH_SIZE):
+        time.sleep(seconds_per_batch)
+
+
+def run_sequential(app, urls, seconds_per_batch):
+    texts = []
+
+    for url in urls:
+        texts.append(get_article_text(app, url))
+        emulate_inference(texts[-1:], seconds_per_batch / SUMMARIZATION_BATCH_SIZE)
+
+    return texts
+
+
+def run_pipelined(app, urls, seconds_per_batch, workers, per_host):
+    texts, window = [], []
+
+    for _, text in download_articles(app, list(enumerate(urls)), workers=workers, per_host=per_host):
+        texts.append(text)
+        window.append(text)
+
+        if len(window) >= SUMMARIZATION_WINDOW:
+            emulate_inference(window, seconds_per_batch)
+            window = []
+
+    emulate_inference(window, seconds_per_batch)
+
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--articles', type=int, default=64, help="Number of articles per run.")
+    parser.add_argument('--delay', type=float, default=0.3, help="Latency in seconds of the stand-in server.")
+    parser.add_argument('--inference', type=float, default=0.5, help="Emulated inference seconds per batch.")
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8, 16], help="Download worker counts.")
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+
+    server = start_server(article_body(), delay=args.delay, content_type='text/html; charset=utf-8')
+    port = server.server_address[1]
+    urls = [f'http://127.0.0.1:{port}/article/{idx}.html' for idx in range(args.articles)]
+
+    print(f'{args.articles} articles, {args.delay}s latency per request, {args.inference}s inference per batch of '
+          f'{SUMMARIZATION_BATCH_SIZE}')
+    print(f'{"mode":>14} {"seconds":>9} {"articles/s":>11} {"speedup":>8}')
+
+    start = time.perf_counter()
+    texts = run_sequential(app, urls, args.inference)
+    baseline = time.perf_counter() - start
+    assert all(texts)
+    print(f'{"sequential":>14} {baseline:>9.2f} {args.articles / baseline:>11.1f} {1:>7.1f}x')
+
+    # All articles live on the same stand-in host, so lift the per-host limit to measure the worker pool itself
+    for workers in args.workers:
+        start = time.perf_counter()
+        texts = run_pipelined(app, urls, args.inference, workers=workers, per_host=workers)
+        elapsed = time.perf_counter() - start
+        assert all(texts)
+
+        print(f'{f"{workers} workers":>14} {elapsed:>9.2f} {args.articles / elapsed:>11.1f} '
+              f'{baseline / elapsed:>7.1f}x')
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+
+    Benchmark of the briefing email delivery in rssbriefing.scripts.send_briefing_emails.
+
+    The messages go to a local SMTP stand-in with an artificial delay per connection, which emulates the TLS and auth
+    handshakes with the remote mail server, and per command. The baseline opens one connection per message, like the
+    former send_single_mail() per user. The bulk run sends through rssbriefing.email.send_bulk_mails, which reuses
+    one connection per batch. With --locmem both runs use Django's in-memory backend instead, to measure the overhead
+    without any SMTP traffic.
+
+    Run from the repository root:
+        python -m benchmarks.bench_email_delivery --messages 500 --connect-delay 0.05 --batch-sizes 50 500
+
+"""
+import argparse
+import logging
+import time
+
+from django.core.mail import EmailMessage, get_connection
+
+from benchmarks.smtp_stand_in import start_server
+from rssbriefing import create_app
+from rssbriefing.email import send_bulk_mails
+
+BODY = 'Good morning!\n\n' + 'Summary of a briefing item, wrapped into paragraphs of 70 chars.\n' * 60
+
+
+def get_messages(nr_messages):
+    return [EmailMessage(subject='Your Monday RoboBriefing', body=BODY, from_email='robobriefing@domain.net',
+                         to=[f'user{idx}@domain.net'])
+            for idx in range(nr_messages)]
+
+
+def get_backend(args, server):
+    if args.locmem:
+        return lambda: get_connection('django.core.mail.backends.locmem.EmailBackend')
+
+    host, port = server.server_address
+    return lambda: get_connection('django.core.mail.backends.smtp.EmailBackend', host=host, port=port,
+                                  username='', password='', use_tls=False, use_ssl=False)
+
+
+def send_one_connection_per_message(backend, messages):
+    for message in messages:
+        backend().send_messages([message])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=500, help="Number of recipients.")
+    parser.add_argument('--connect-delay', type=float, default=0.05,
+                        help="Seconds of handshake per SMTP connection.")
+    parser.add_argument('--command-delay', type=float, default=0.0, help="Seconds of round trip per SMTP command.")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[50, 500],
+                        help="Messages per connection of the bulk runs.")
+    parser.add_argument('--locmem', action='store_true', help="Use Django's in-memory backend instead of SMTP.")
+    args = parser.parse_args()
+
+    # The app config also configures the Django settings of the email backend
+    app = create_app()
+    app.logger.setLevel(logging.WARNING)
+    app.app_context().push()
+
+    server = start_server(args.connect_delay, args.command_delay)
+    backend = get_backend(args, server)
+
+    print(f'{args.messages} messages, {"locmem" if args.locmem else "SMTP"} backend')
+    print(f'{"mode":>22} {"seconds":>8} {"msgs/s":>8} {"connections":>12} {"speedup":>8}')
+
+    runs = [('connection per message', None)] + [(f'bulk, batches of {size}', size) for size in args.batch_sizes]
+
+    baseline = None
+    for name, batch_size in runs:
+        server.stats.update(connections=0, messages=0)
+        messages = get_messages(args.messages)
+
+        start = time.perf_counter()
+        if batch_size is None:
+            send_one_connection_per_message(backend, messages)
+        else:
+            failed = send_bulk_mails(messages, connection=backend(), batch_size=batch_size)
+            assert not failed, f'{len(failed)} messages failed'
+        elapsed = time.perf_counter() - start
+
+        baseline = baseline or elapsed
+        print(f'{name:>22} {elapsed:>8.2f} {args.messages / elapsed:>8.0f} {server.stats["connections"]:>12} '
+              f'{baseline / elapsed:>7.1f}x')
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
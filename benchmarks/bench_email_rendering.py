@@ -0,0 +1,84 @@
+"""
+
+    Benchmark of building the briefing emails of a run in rssbriefing.scripts.send_briefing_emails.
+
+    The baseline renders briefing_email.txt and MIME encodes the message for each user, like the former loop over
+    send_single_mail(). The prerendered run renders and encodes the briefing once with rssbriefing.email
+    .get_briefing_email and only fills in the recipient headers per user. Both produce the bytes handed
+    to the SMTP connection, the briefing items are taken from the stored corpus of feed entries.
+
+    Run from the repository root:
+        python -m benchmarks.bench_email_rendering --messages 10000 --items 10
+
+"""
+import argparse
+import json
+import os
+import time
+from types import SimpleNamespace
+
+from django.core.mail import EmailMessage
+from flask import render_template
+
+from rssbriefing import create_app
+from rssbriefing.email import get_briefing_email, wrap_briefing_items
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'feed_entries.json')
+
+BRIEFING_DATE = 'June 01, 2020 at 06:00 AM'
+
+
+def get_items(nr_items):
+    with open(CORPUS_PATH) as f:
+        entries = json.load(f)
+
+    return [SimpleNamespace(title=entry['title'], summary=entry['description'] * 3, feed_title='Stand-in feed',
+                            link=f'https://example.com/entry/{idx}')
+            for idx, entry in enumerate(entries[:nr_items])]
+
+
+def render_per_user(app, items, users):
+    wrapped_items = wrap_briefing_items(items)
+
+    for user in users:
+        body = render_template('briefing/briefing_email.txt', items=wrapped_items, briefing_date=BRIEFING_DATE)
+        message = EmailMessage('Your Monday RoboBriefing', body, app.config['ADMINS'][0], [user.email])
+        message.message().as_bytes(linesep='\r\n')
+
+
+def render_once(app, items, users):
+    briefing_email = get_briefing_email(items, BRIEFING_DATE, 'Monday')
+
+    for user in users:
+        message = briefing_email.message_for(user.email)
+        message.message().as_bytes(linesep='\r\n')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=10000, help="Number of recipients.")
+    parser.add_argument('--items', type=int, default=10, help="Number of briefing items.")
+    args = parser.parse_args()
+
+    # The app config also configures the Django settings of the email backend
+    app = create_app()
+    app.app_context().push()
+
+    items = get_items(args.items)
+    users = [SimpleNamespace(email=f'user{idx}@domain.net') for idx in range(args.messages)]
+
+    print(f'{args.messages} messages, {len(items)} items')
+    print(f'{"mode":>12} {"seconds":>8} {"us/msg":>8} {"speedup":>8}')
+
+    baseline = None
+    for name, build in [('per user', render_per_user), ('prerendered', render_once)]:
+        start = time.perf_counter()
+        build(app, items, users)
+        elapsed = time.perf_counter() - start
+
+        baseline = baseline or elapsed
+        print(f'{name:>12} {elapsed:>8.2f} {elapsed / args.messages * 1e6:>8.0f} {baseline / elapsed:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+
+    Benchmark of the concurrent feed fetcher used by rssbriefing.scripts.update_all_feeds.
+
+    All feeds are served by a local HTTP stand-in with an artificial latency per request, so the wall-clock time
+    should drop roughly linearly with the number of workers until the per-host limit or the CPU cost of parsing
+    becomes the bottleneck.
+
+    Run from the repository root:
+        python -m benchmarks.bench_fetch_feeds --feeds 64 --delay 0.2
+
+"""
+import argparse
+import time
+
+from benchmarks.http_stand_in import rss_body, start_server
+from rssbriefing.feed import fetch_feeds
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--feeds', type=int, default=64, help="Number of feeds to fetch per run.")
+    parser.add_argument('--delay', type=float, default=0.2, help="Latency in seconds of the stand-in server.")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32],
+                        help="Worker counts to benchmark.")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    server = start_server(rss_body(), delay=args.delay)
+    port = server.server_address[1]
+
+    # All feeds live on the same stand-in host, so lift the per-host limit to measure the worker pool itself
+    feed_hrefs = [(idx, f'http://127.0.0.1:{port}/feed/{idx}.xml') for idx in range(args.feeds)]
+
+    print(f'{args.feeds} feeds, {args.delay}s latency per request')
+    print(f'{"workers":>8} {"seconds":>9} {"feeds/s":>9} {"speedup":>8}')
+
+    baseline = None
+    for workers in args.workers:
+        start = time.perf_counter()
+        results = list(fetch_feeds(feed_hrefs, workers=workers, per_host=workers, timeout=10))
+        elapsed = time.perf_counter() - start
+
+        assert all(len(feed_dict.entries) == 20 for _, feed_dict in results)
+
+        baseline = baseline or elapsed
+        print(f'{workers:>8} {elapsed:>9.2f} {len(results) / elapsed:>9.1f} {baseline / elapsed:>7.1f}x')
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+
+    Micro-benchmark of the HTML to text conversion of feed entry titles and descriptions.
+
+    Compares a fresh, fully configured html2text.HTML2Text per string (the previous behaviour of
+    rssbriefing.feed.parse_entry_attribute) against rssbriefing.feed.html_to_text, and checks that both produce
+    the same output on the stored corpus of feed entries in benchmarks/data/feed_entries.json.
+
+    Run from the repository root:
+        python -m benchmarks.bench_html_to_text --repeat 200
+
+"""
+import argparse
+import json
+import os
+import time
+
+import html2text
+
+from rssbriefing.feed import html_to_text
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'feed_entries.json')
+
+
+def convert_with_fresh_parser(text):
+    text_maker = html2text.HTML2Text()
+    text_maker.ignore_links = True
+    text_maker.ignore_images = True
+    text_maker.body_width = 0
+
+    return text_maker.handle(text)
+
+
+def time_per_string(convert, texts, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            convert(text)
+
+    return (time.perf_counter() - start) / (repeat * len(texts)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=200, help="Passes over the corpus per measurement.")
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH) as f:
+        entries = json.load(f)
+
+    for attribute in ('title', 'description'):
+        texts = [entry[attribute] for entry in entries]
+
+        mismatches = [text for text in texts if convert_with_fresh_parser(text) != html_to_text.handle(text)]
+        assert not mismatches, f'Output differs for: {mismatches}'
+
+        before = time_per_string(convert_with_fresh_parser, texts, args.repeat)
+        after = time_per_string(html_to_text.handle, texts, args.repeat)
+
+        print(f'{attribute:>12}: {len(texts)} strings, identical output | '
+              f'fresh HTML2Text {before:7.1f} us | html_to_text {after:7.1f} us | speedup {before / after:5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+
+    Benchmark of the parallel briefing generation across users in rssbriefing.briefing_model.briefing.
+
+    Builds a temporary SQLite db with a synthetic user base: one feed per reference feed of the topic model, filled
+    with the stored corpus of feed entries from the last 24h, and users subscribed to random subsets of the feeds.
+    After training the topic model once, the briefings of all users are generated with an increasing number of
+    worker processes. Summarization is skipped, since it downloads the articles.
+
+    Run from the repository root on a multi-core box:
+        python -m benchmarks.bench_parallel_briefing --users 200 --workers 1 2 4 8
+
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from rssbriefing import create_app, db
+from rssbriefing.briefing_model.briefing import generate_briefings
+from rssbriefing.briefing_model.configs import reference_feeds
+from rssbriefing.briefing_model.topic_modeling import compute_topics
+from rssbriefing.models import Briefing, Feed, Item, Users
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'feed_entries.json')
+
+
+def populate_db(nr_users, items_per_feed, seed=0):
+    random.seed(seed)
+
+    with open(CORPUS_PATH) as f:
+        entries = json.load(f)
+
+    feeds = [Feed(title=title, href=f'https://example.com/{idx}.xml') for idx, title in enumerate(reference_feeds)]
+    db.session.add_all(feeds)
+    db.session.commit()
+
+    now = datetime.utcnow()
+    for feed in feeds:
+        for idx in range(items_per_feed):
+            entry = random.choice(entries)
+            db.session.add(Item(title=entry['title'], description=entry['description'],
+                                link=f'https://example.com/{feed.id}/{idx}', guid=f'{feed.id}-{idx}',
+                                created=now - timedelta(minutes=random.randint(1, 23 * 60)), feed_id=feed.id))
+
+    # User 1 is the reference user of the topic model training, subscribed to all reference feeds
+    for idx in range(nr_users):
+        user = Users(username=f'user_{idx}', email=f'user_{idx}@example.com')
+        user.feeds = feeds if idx == 0 else random.sample(feeds, k=random.randint(3, len(feeds)))
+        db.session.add(user)
+
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200, help="Size of the synthetic user base.")
+    parser.add_argument('--items_per_feed', type=int, default=40, help="Posts per feed in the last 24h.")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--multi_user', action='store_true', help="Rank with a single batched topic inference.")
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp()
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + db_path, 'SQLALCHEMY_TRACK_MODIFICATIONS': False})
+    app.app_context().push()
+
+    db.create_all()
+    populate_db(args.users, args.items_per_feed)
+
+    topic_model = compute_topics(app)
+    user_ids = [user.id for user in Users.query.all()]
+
+    print(f'{args.users} users, {args.items_per_feed * len(reference_feeds)} posts, multi_user={args.multi_user}')
+    print(f'{"workers":>8} {"seconds":>9} {"users/s":>9} {"speedup":>8}')
+
+    baseline = None
+    for workers in args.workers:
+        Briefing.query.delete()
+        db.session.commit()
+
+        start = time.perf_counter()
+        results = generate_briefings(app, user_ids, topic_model, multi_user=args.multi_user, workers=workers,
+                                     summarize=False)
+        elapsed = time.perf_counter() - start
+
+        assert None not in results.values(), 'Briefing generation failed for some users'
+
+        baseline = baseline or elapsed
+        print(f'{workers:>8} {elapsed:>9.2f} {len(user_ids) / elapsed:>9.1f} {baseline / elapsed:>7.1f}x')
+
+    os.close(db_fd)
+    os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
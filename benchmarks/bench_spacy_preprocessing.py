@@ -0,0 +1,64 @@
+"""
+
+    Benchmark of the spaCy preprocessing for topic modeling and ranking.
+
+    Compares one nlp(doc) call per post with the full pipeline (the previous behaviour) against the batched
+    rssbriefing.briefing_model.preprocessing.preprocess_documents with nlp.pipe and disabled parser and NER,
+    on the stored corpus of feed entries in benchmarks/data/feed_entries.json, repeated to the requested size.
+    Both must yield the same tokens.
+
+    Run from the repository root:
+        python -m benchmarks.bench_spacy_preprocessing --docs 2000 --batch_sizes 64 256 --n_process 1 2
+
+"""
+import argparse
+import json
+import os
+import time
+from collections import namedtuple
+
+import en_core_web_sm
+
+from rssbriefing.briefing_model.preprocessing import filter_tokens, get_text, preprocess_documents
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'feed_entries.json')
+
+Post = namedtuple('Post', ['item_id', 'title', 'description'])
+
+
+def load_posts(nr_docs):
+    with open(CORPUS_PATH) as f:
+        entries = json.load(f)
+
+    # Distinct item ids, so that repeated entries count as separate documents
+    return [Post(idx, entries[idx % len(entries)]['title'], entries[idx % len(entries)]['description'])
+            for idx in range(nr_docs)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--docs', type=int, default=2000, help="Number of documents to preprocess.")
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[64, 256, 1000])
+    parser.add_argument('--n_process', type=int, nargs='+', default=[1, 2])
+    args = parser.parse_args()
+
+    posts = load_posts(args.docs)
+    nlp = en_core_web_sm.load()
+
+    start = time.perf_counter()
+    expected = [filter_tokens(nlp(get_text(post))) for post in posts]
+    elapsed = time.perf_counter() - start
+    print(f'{"one nlp() call per doc":>32}: {args.docs / elapsed:8.1f} docs/s')
+
+    for n_process in args.n_process:
+        for batch_size in args.batch_sizes:
+            start = time.perf_counter()
+            corpus = preprocess_documents(posts, nlp, batch_size=batch_size, n_process=n_process)
+            elapsed = time.perf_counter() - start
+
+            assert corpus == expected, 'Batched preprocessing yields different tokens'
+            print(f'{f"nlp.pipe batch {batch_size}, {n_process} proc":>32}: {args.docs / elapsed:8.1f} docs/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+
+    Benchmark of the cleanup of scraped articles before summarization.
+
+    Compares the previous implementation of rssbriefing.briefing_model.preprocessing.preprocess_for_summarization
+    (re.findall per raw regex, then str.find and slicing per match) against the precompiled SummarizationCleaner, and
+    checks that both produce the same output. The articles are built from the stored corpus of feed entries and
+    padded with the boilerplate the cleanup targets: "Read more:" and "Watch video" paragraphs, newsletter blurbs,
+    photo credits, datelines and phrases.
+
+    Run from the repository root:
+        python -m benchmarks.bench_summarization_preprocessing --articles 20 --paragraphs 50 200 800
+
+"""
+import argparse
+import json
+import os
+import random
+import re
+import time
+
+from rssbriefing.briefing_model.configs import SUMM_PREPROCESSING_PHRASES, SUMM_PREPROCESSING_REGEXES, \
+    SUMM_PREPROCESSING_RAW_TEXT_REGEXES, REPLACEMENTS
+from rssbriefing.briefing_model.preprocessing import preprocess_for_summarization
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'feed_entries.json')
+
+BOILERPLATE = ["Read more: {title}\n\n",
+               "More: {title}\n\n",
+               "Watch video 02:31 {title}\n\n",
+               "DW sends out a daily selection of hard news and quality journalism. Sign up here.",
+               "FILE PHOTO: {title} REUTERS/Staff\n",
+               "Read More",
+               "(The refiled story fixes spelling error in first paragraph)",
+               "[L8N2DC056]",
+               "<U+200B>"]
+
+
+def preprocess_for_summarization_reference(doc):
+    """ The previous implementation, kept here as reference for the equivalence check. """
+    for regex in SUMM_PREPROCESSING_RAW_TEXT_REGEXES:
+        matches = re.findall(regex, doc)
+        if matches:
+            for match in matches:
+                start_index = doc.find(match)
+                end_index = start_index + len(match)
+                doc = doc[:start_index] + doc[end_index:]
+
+    for replacement_tuple in REPLACEMENTS:
+        doc = doc.replace(replacement_tuple[0], replacement_tuple[1])
+
+    for regex in SUMM_PREPROCESSING_REGEXES:
+        matches = re.findall(regex, doc)
+        if matches:
+            for match in matches:
+                start_index = doc.find(match)
+                end_index = start_index + len(match)
+                doc = doc[:start_index] + doc[end_index:]
+
+    for phrase in SUMM_PREPROCESSING_PHRASES:
+        start_index = doc.find(phrase)
+        if start_index != -1:
+            end_index = start_index + len(phrase)
+            doc = doc[:start_index] + doc[end_index:]
+    return doc
+
+
+def build_articles(entries, nr_articles, nr_paragraphs, seed=0):
+    random.seed(seed)
+    articles = []
+
+    for _ in range(nr_articles):
+        paragraphs = []
+        for _ in range(nr_paragraphs):
+            entry = random.choice(entries)
+            paragraphs.append(f"{entry['description']}\n\n")
+
+            if random.random() < 0.1:
+                paragraphs.append(random.choice(BOILERPLATE).format(title=random.choice(entries)['title']))
+
+        # About half of the articles carry a dateline, the others are scanned in full by the dateline regex
+        if random.random() < 0.5:
+            paragraphs.insert(random.randint(0, 3), 'WASHINGTON — ')
+
+        articles.append(''.join(paragraphs))
+
+    return articles
+
+
+def seconds_per_article(clean, articles):
+    start = time.perf_counter()
+    for article in articles:
+        clean(article)
+
+    return (time.perf_counter() - start) / len(articles)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--articles', type=int, default=20, help="Number of articles per length.")
+    parser.add_argument('--paragraphs', type=int, nargs='+', default=[50, 200, 800],
+                        help="Article lengths in paragraphs.")
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH) as f:
+        entries = json.load(f)
+
+    print(f'{"paragraphs":>10} {"chars":>9} {"before ms":>10} {"after ms":>9} {"speedup":>8}')
+
+    for nr_paragraphs in args.paragraphs:
+        articles = build_articles(entries, args.articles, nr_paragraphs)
+
+        mismatches = [article for article in articles
+                      if preprocess_for_summarization_reference(article) != preprocess_for_summarization(article)]
+        assert not mismatches, f'Output differs for {len(mismatches)} articles'
+
+        before = seconds_per_article(preprocess_for_summarization_reference, articles)
+        after = seconds_per_article(preprocess_for_summarization, articles)
+        chars = sum(map(len, articles)) // len(articles)
+
+        print(f'{nr_paragraphs:>10} {chars:>9} {before * 1e3:>10.2f} {after * 1e3:>9.2f} {before / after:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
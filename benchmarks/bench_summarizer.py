@@ -0,0 +1,90 @@
+"""
+
+    Benchmark of the summarization model variants of rssbriefing.briefing_model.summarization: the full precision
+    model and its dynamically quantized int8 variant (SUMMARIZATION_QUANTIZED).
+
+    Each variant runs in a fresh process, which reports the load time, the peak resident memory after loading and
+    after inference, and the summaries per second over synthetic articles of ~600 tokens built from the stored corpus
+    of feed entries. A second get_summarizer() call in the same process shows the cost of a warm reuse.
+
+    Run from the repository root:
+        python -m benchmarks.bench_summarizer --articles 16
+
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import time
+
+from flask import Flask
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'feed_entries.json')
+
+
+def build_articles(nr_articles, sentences_per_article=24):
+    with open(CORPUS_PATH) as f:
+        entries = json.load(f)
+
+    sentences = [entry['description'] for entry in entries]
+
+    return [' '.join(sentences[(idx + offset) % len(sentences)] for offset in range(sentences_per_article))
+            for idx in range(nr_articles)]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_variant(quantized, nr_articles, results):
+    # Imported in the child, so that each variant starts without the model or torch in memory
+    from rssbriefing.briefing_model.summarization import get_summarizer, summarize_texts
+
+    app = Flask(__name__)
+    articles = build_articles(nr_articles)
+
+    start = time.perf_counter()
+    get_summarizer(app, quantized)
+    load_seconds = time.perf_counter() - start
+    load_rss = peak_rss_mb()
+
+    start = time.perf_counter()
+    nlp, tokenizer = get_summarizer(app, quantized)
+    warm_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    summaries, _ = summarize_texts(app, articles, nlp, tokenizer)
+    inference_seconds = time.perf_counter() - start
+
+    results[quantized] = dict(load=load_seconds, warm=warm_seconds, load_rss=load_rss, peak_rss=peak_rss_mb(),
+                              summaries=sum(summary is not None for summary in summaries),
+                              throughput=len(articles) / inference_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--articles', type=int, default=16, help="Number of articles to summarize per variant.")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Manager().dict()
+
+    for quantized in (False, True):
+        process = context.Process(target=run_variant, args=(quantized, args.articles, results))
+        process.start()
+        process.join()
+
+    print(f'{args.articles} articles')
+    print(f'{"variant":>8} {"load s":>8} {"warm s":>8} {"RSS MB":>8} {"peak MB":>8} {"summaries":>10} '
+          f'{"per s":>7}')
+
+    for quantized, result in sorted(results.items()):
+        print(f'{"int8" if quantized else "fp32":>8} {result["load"]:>8.1f} {result["warm"]:>8.4f} '
+              f'{result["load_rss"]:>8.0f} {result["peak_rss"]:>8.0f} {result["summaries"]:>10} '
+              f'{result["throughput"]:>7.2f}')
+
+
+if __name__ == '__main__':
+    main()
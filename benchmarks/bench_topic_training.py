@@ -0,0 +1,79 @@
+"""
+
+    Benchmark of the LDA training backends of rssbriefing.briefing_model.topic_modeling.train_model.
+
+    Trains the topic model on a fixed corpus, the stored feed entries in benchmarks/data/feed_entries.json repeated
+    to the requested size, once with the single core LdaModel and once per worker count with LdaMulticore. Reports
+    the training time and the average 'c_v' topic coherence, to check that the parallel trainer holds the quality.
+
+    Run from the repository root on a multi-core box:
+        python -m benchmarks.bench_topic_training --docs 5000 --workers 1 2 4 8
+
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+
+import en_core_web_sm
+from flask import Flask
+from gensim.corpora import Dictionary
+
+from rssbriefing.briefing_model.preprocessing import preprocess_documents
+from rssbriefing.briefing_model.topic_modeling import get_bow_representation, show_model_stats, train_model
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'feed_entries.json')
+
+Post = namedtuple('Post', ['item_id', 'title', 'description'])
+
+
+def load_corpus(nr_docs):
+    with open(CORPUS_PATH) as f:
+        entries = json.load(f)
+
+    posts = [Post(idx, entries[idx % len(entries)]['title'], entries[idx % len(entries)]['description'])
+             for idx in range(nr_docs)]
+
+    corpus = preprocess_documents(posts, en_core_web_sm.load())
+
+    # Same filtering as get_dictionary, without saving the dictionary of the run
+    dictionary = Dictionary(corpus)
+    dictionary.filter_extremes(no_below=4, no_above=0.6)
+
+    return corpus, dictionary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--docs', type=int, default=5000, help="Size of the training corpus.")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="Worker counts of the multicore backend.")
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.logger.setLevel(logging.WARNING)
+
+    corpus, dictionary = load_corpus(args.docs)
+    bow_corpus = get_bow_representation(corpus, dictionary)
+
+    runs = [('lda', None)] + [('lda_multicore', workers) for workers in args.workers]
+
+    print(f'{args.docs} docs, {len(dictionary)} tokens')
+    print(f'{"backend":>14} {"workers":>8} {"seconds":>9} {"speedup":>8} {"coherence":>10}')
+
+    baseline = None
+    for backend, workers in runs:
+        start = time.perf_counter()
+        model = train_model(app, bow_corpus, dictionary, backend=backend, workers=workers)
+        elapsed = time.perf_counter() - start
+
+        coherence = show_model_stats(app, model, bow_corpus, corpus, dictionary)
+
+        baseline = baseline or elapsed
+        print(f'{backend:>14} {workers or "-":>8} {elapsed:>9.1f} {baseline / elapsed:>7.1f}x {coherence:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+
+    Local HTTP stand-in for remote feed and article hosts, used by the benchmarks.
+
+    Every request sleeps for a fixed delay before the response is sent, to emulate network latency of a remote host
+    without depending on the network.
+
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def start_server(body, delay, content_type='application/rss+xml; charset=utf-8'):
+    """ Serve the same body on every path of a local HTTP server in a background thread.
+
+    :param body: [bytes] response body
+    :param delay: [float] seconds to sleep before each response
+    :param content_type: [Str]
+    :return server: [http.server.ThreadingHTTPServer] call server.shutdown() when done
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 128
+
+    server = Server(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def rss_body(nr_entries=20):
+    entries = ''.join(f"""
+        <item>
+            <title>Entry {idx}</title>
+            <link>https://example.com/entry/{idx}</link>
+            <guid>https://example.com/entry/{idx}</guid>
+            <description>&lt;p&gt;Description of entry {idx}&lt;/p&gt;</description>
+            <pubDate>Mon, 01 Jun 2020 08:00:00 GMT</pubDate>
+        </item>""" for idx in range(nr_entries))
+
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0">
+    <channel>
+        <title>Stand-in feed</title>
+        <link>https://example.com</link>
+        <description>Local stand-in feed for benchmarks</description>{entries}
+    </channel>
+</rss>""".encode('utf-8')
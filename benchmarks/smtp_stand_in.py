@@ -0,0 +1,71 @@
+"""
+
+    Local SMTP stand-in for the mail server, used by the benchmarks.
+
+    Accepts and discards every message. Each new connection sleeps for a fixed delay before the greeting, to emulate
+    the TCP, TLS and auth handshakes with a remote mail server, and each command for a smaller delay, to emulate the
+    round trip time.
+
+"""
+import socketserver
+import threading
+import time
+
+
+def start_server(connect_delay, command_delay=0.0):
+    """ Run a local SMTP server in a background thread.
+
+    :param connect_delay: [float] seconds to sleep before the greeting of each connection
+    :param command_delay: [float] seconds to sleep before each reply
+    :return server: [socketserver.ThreadingTCPServer] server.server_address is the (host, port) to connect to, call
+                    server.shutdown() when done. server.stats counts the connections and messages.
+    """
+
+    class Handler(socketserver.StreamRequestHandler):
+
+        def reply(self, line):
+            time.sleep(command_delay)
+            self.wfile.write(line + b'\r\n')
+
+        def handle(self):
+            time.sleep(connect_delay)
+            server.count('connections')
+            self.wfile.write(b'220 localhost SMTP stand-in\r\n')
+
+            for line in self.rfile:
+                command = line.strip().upper()
+
+                if command.startswith(b'EHLO'):
+                    self.reply(b'250-localhost\r\n250 8BITMIME')
+                elif command == b'DATA':
+                    self.reply(b'354 End data with <CR><LF>.<CR><LF>')
+                    for data_line in self.rfile:
+                        if data_line == b'.\r\n':
+                            break
+                    server.count('messages')
+                    self.reply(b'250 OK')
+                elif command == b'QUIT':
+                    self.reply(b'221 Bye')
+                    return
+                else:
+                    # HELO, MAIL, RCPT, RSET, NOOP
+                    self.reply(b'250 OK')
+
+    class Server(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+        request_queue_size = 128
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.stats = {'connections': 0, 'messages': 0}
+            self._lock = threading.Lock()
+
+        def count(self, key):
+            with self._lock:
+                self.stats[key] += 1
+
+    server = Server(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
@@ -36,6 +36,39 @@ class Config(object):
     ADMINS = ['robobriefing@posteo.net']
     BETA_CODE = os.environ.get('BETA_CODE') or 'test'
 
+    # Concurrent feed fetching in rssbriefing.scripts.update_all_feeds
+    FEED_FETCH_WORKERS = 8
+    FEED_FETCH_PER_HOST = 2
+    FEED_FETCH_TIMEOUT = 10
+
+    # Adaptive polling schedule of feeds in rssbriefing.feed_scheduler, intervals in minutes
+    FEED_POLL_MIN_INTERVAL = 15
+    FEED_POLL_MAX_INTERVAL = 24 * 60
+    FEED_POLL_HISTORY_DAYS = 7
+    FEED_POLL_BACKOFF_FACTOR = 2
+
+    # Feed refresh job queue of the web app, processed by rssbriefing.scripts.refresh_worker, in seconds
+    REFRESH_WORKER_POLL_INTERVAL = 2
+    REFRESH_JOB_TIMEOUT = 300
+
+    # Seconds until a new briefing shows up on the public briefing pages of other processes, see rssbriefing.cache
+    BRIEFING_CACHE_TTL = 60
+
+    # Seconds a process caches the record of a logged in user, see rssbriefing.db_utils.get_user_record
+    USER_CACHE_TTL = 300
+
+    # Seconds until a change of a user's feeds in another session of the user shows up in the navbar, see
+    # rssbriefing.db_utils.get_feedlist_for_dropdown
+    FEEDLIST_CACHE_TTL = 60
+
+    # Bulk delivery of the briefing emails in rssbriefing.scripts.send_briefing_emails over EMAIL_WORKERS concurrent
+    # SMTP connections, rate limit in messages per second (None for no limit) and retry delay in seconds
+    EMAIL_WORKERS = 4
+    EMAIL_BATCH_SIZE = 100
+    EMAIL_RATE_LIMIT = None
+    EMAIL_MAX_RETRIES = 2
+    EMAIL_RETRY_DELAY = 5
+
 
 class ProductionConfig(Config):
     DB_NAME = os.environ.get('RDS_DB_NAME')
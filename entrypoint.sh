@@ -7,6 +7,15 @@ if [ -v DB_UPGRADE ]; then
     flask db upgrade
 fi
 
+# Feed refreshes and subscriptions of the web app are processed by a background worker, restarted if it exits
+(
+    while true; do
+        python -m rssbriefing.scripts.refresh_worker || true
+        echo "Refresh worker exited, restarting in 5 seconds..." >&2
+        sleep 5
+    done
+) &
+
 # Always launch the gunicorn app server
 exec gunicorn -b :5000 --workers=2 --threads=4 --worker-class=gthread --worker-tmp-dir /dev/shm application:application
 
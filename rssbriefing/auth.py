@@ -5,7 +5,7 @@ from flask import Blueprint, current_app as app, flash, g, redirect, render_temp
 from werkzeug.security import check_password_hash, generate_password_hash
 
 from rssbriefing import db
-from rssbriefing.db_utils import get_user_by_username
+from rssbriefing.db_utils import get_user_by_username, get_user_record, invalidate_user
 from rssbriefing.models import Users
 from rssbriefing.forms import ResetPasswordRequestForm, ResetPasswordForm
 from rssbriefing.email import send_password_reset_email
@@ -32,7 +32,8 @@ def load_logged_in_user():
     if user_id is None:
         g.user = None
     else:
-        g.user = Users.query.get(user_id)
+        # Cached record instead of the Users object, thus most requests don't hit the db for the user
+        g.user = get_user_record(user_id)
 
 
 @bp.route('/register', methods=('GET', 'POST'))
@@ -154,6 +155,8 @@ def reset_password(token):
     if form.validate_on_submit():
         user.set_password(form.password.data)
         db.session.commit()
+        # Evicts the cached record of this process only, see invalidate_user
+        invalidate_user(user.id)
         flash('Your password has been reset.')
 
         return redirect(url_for('auth.login'))
@@ -4,6 +4,7 @@ Briefing generation module
 
 """
 import argparse
+import multiprocessing
 import sys
 from datetime import datetime
 
@@ -12,9 +13,10 @@ import pytz
 from rssbriefing import create_app
 from rssbriefing import db
 from rssbriefing.briefing_model.configs import DISCARD_FEEDS, DISCARD_LIVE_POSTS
-from rssbriefing.briefing_model.ranking import get_candidates, rank_candidates
-from rssbriefing.briefing_model.summarization import enrich_with_summary
-from rssbriefing.briefing_model.topic_modeling import compute_topics
+from rssbriefing.briefing_model.ranking import get_candidates, rank_candidates, get_candidates_for_users, \
+    infer_topic_distributions, group_rows_by_feed, rank_user_candidates
+from rssbriefing.briefing_model.summarization import enrich_with_summary, get_summarizer
+from rssbriefing.briefing_model.topic_modeling import compute_topics, load_latest_topics
 from rssbriefing.db_utils import get_user_by_id, get_all_users
 
 
@@ -30,6 +32,8 @@ def save_to_db(briefing_items):
     # Commit to db only after looping over all selected Briefing items
     db.session.commit()
 
+    # The web processes pick up the new batch once their cached briefing expires after BRIEFING_CACHE_TTL seconds
+
 
 def filter_posts(posts):
     posts = [post for post in posts if post.feed_title not in DISCARD_FEEDS]
@@ -44,6 +48,17 @@ def parse_args():
     parser.add_argument('-t', '--similarity_threshold',
                         type=float,
                         help="Supply similarity threshold as necessary condition for briefing items.")
+    parser.add_argument('-m', '--multi_user',
+                        action='store_true',
+                        help="Infer the topics of the candidates of all users in a single batched pass, "
+                             "instead of once per user and candidate.")
+    parser.add_argument('-w', '--workers',
+                        type=int,
+                        default=1,
+                        help="Number of worker processes generating the briefings of different users in parallel.")
+    parser.add_argument('-s', '--stored_model',
+                        action='store_true',
+                        help="Rank with the latest stored topic model instead of computing the current topics.")
 
     command_group = parser.add_mutually_exclusive_group(required=True)
 
@@ -58,6 +73,151 @@ def parse_args():
     return parser.parse_args()
 
 
+def prepare_multi_user_ranking(app, user_ids, topic_model):
+    """ Gather the union of all candidates once and infer their topic distributions in one pass.
+
+    :return: [Dict] the shared state of rank_user_candidates() for all users
+    """
+    candidates, subscriptions = get_candidates_for_users(app, user_ids)
+    candidates = filter_posts(candidates)
+
+    return dict(candidates=candidates,
+                subscriptions=subscriptions,
+                rows_by_feed=group_rows_by_feed(candidates),
+                topic_matrix=infer_topic_distributions(app, candidates, topic_model))
+
+
+def generate_user_briefing(app, user_id, topic_model, similarity_threshold=None, ranking_state=None, summarize=True):
+    """ Select, summarize and save the briefing items of a single user.
+
+    :param app: [flask.Flask] The flask object implements a WSGI application
+    :param user_id: [int]
+    :param topic_model: [gensim.models.LdaModel] the trained topic model
+    :param similarity_threshold: [float] optional condition of a minimum threshold for the similarity score
+    :param ranking_state: [Dict] opt. see prepare_multi_user_ranking(), else the candidates are ranked per user
+    :param summarize: [Bool] whether to enrich the briefing items with a summary of the article
+    :return: [int] number of saved briefing items
+    """
+    user = get_user_by_id(user_id)
+    app.logger.info(f'Generating briefing for user {user}...')
+
+    if ranking_state:
+        selected = rank_user_candidates(app, user.id, ranking_state['subscriptions'][user.id],
+                                        ranking_state['candidates'], ranking_state['rows_by_feed'],
+                                        ranking_state['topic_matrix'], topic_model, similarity_threshold)
+
+    else:
+        candidates = get_candidates(app, user.id)
+
+        candidates = filter_posts(candidates)
+
+        selected = rank_candidates(app, candidates, topic_model, similarity_threshold)
+
+    if summarize:
+        selected = enrich_with_summary(app, selected)
+
+    app.logger.info(f'The chosen briefing items are:')
+    for post in selected:
+        app.logger.info('----------------------------------------------------')
+        app.logger.info(f'Post title: \n{post.title}')
+        app.logger.info('----------------------------------------------------')
+        app.logger.info(f'Post description: \n{post.description}')
+        app.logger.info(f'Post summary: \n{post.summary}')
+        app.logger.info(
+            f'Post topic id {post.reference}, ranked {post.guid}: \n {topic_model.print_topic(int(post.reference), topn=10)}')
+        app.logger.info(f'topic probability: \n{post.score}')
+
+    app.logger.info(f'Writing {len(selected)} briefing items for user {user} to DB...')
+    save_to_db(selected)
+    app.logger.info('DB write done.')
+
+    return len(selected)
+
+
+def generate_user_briefing_isolated(app, user_id, *args, **kwargs):
+    """ generate_user_briefing() which logs and swallows a failure, so that it doesn't abort the briefings of the
+    other users.
+
+    :return: [int] number of saved briefing items, None if the briefing generation failed
+    """
+    try:
+        return generate_user_briefing(app, user_id, *args, **kwargs)
+
+    except Exception:
+        app.logger.error(f'Briefing generation failed for user {user_id}', exc_info=sys.exc_info())
+        db.session.rollback()
+
+        return None
+
+
+# Read-only state of the briefing run, set before forking the worker processes, which inherit it copy-on-write
+_worker_state = {}
+
+
+def _init_worker():
+    app = _worker_state['app']
+    app.app_context().push()
+
+    # Open fresh db connections in this process instead of using pooled connections inherited from the parent
+    db.engine.dispose()
+
+    if _worker_state['summarize']:
+        # Load the summarization model in the worker, torch may hang in a process forked after it ran in the parent
+        get_summarizer(app)
+
+
+def _generate_in_worker(user_id):
+    state = _worker_state
+
+    return user_id, generate_user_briefing_isolated(state['app'], user_id, state['topic_model'],
+                                                    state['similarity_threshold'], state['ranking_state'],
+                                                    state['summarize'])
+
+
+def generate_briefings(app, user_ids, topic_model, similarity_threshold=None, multi_user=False, workers=1,
+                       summarize=True):
+    """ Generate the briefings of the given users, optionally sharded across a pool of worker processes.
+
+    The workers are forked after the topic model (and the multi user ranking state) are loaded, thus they share a
+    read-only copy of them. The summarization model is loaded by each worker itself, since the thread pools of torch
+    don't survive a fork, thus this process must not have run it before. Each worker has its own db connections and
+    session.
+
+    :param app: [flask.Flask] The flask object implements a WSGI application
+    :param user_ids: [Lst[int]]
+    :param topic_model: [gensim.models.LdaModel] the trained topic model
+    :param similarity_threshold: [float] optional condition of a minimum threshold for the similarity score
+    :param multi_user: [Bool] rank the candidates of all users with a single batched topic inference
+    :param workers: [int] number of worker processes, 1 to generate all briefings in this process
+    :param summarize: [Bool] whether to enrich the briefing items with a summary of the article
+    :return: [Dict[int, int]] number of saved briefing items per user_id, None for users whose briefing failed
+    """
+    ranking_state = prepare_multi_user_ranking(app, user_ids, topic_model) if multi_user else None
+
+    if workers > 1:
+        _worker_state.update(app=app, topic_model=topic_model, similarity_threshold=similarity_threshold,
+                             ranking_state=ranking_state, summarize=summarize)
+
+        # Don't hand open db connections down to the forked workers
+        db.session.remove()
+        db.engine.dispose()
+
+        app.logger.info(f'Generating briefings of {len(user_ids)} users with {workers} worker processes...')
+
+        with multiprocessing.get_context('fork').Pool(workers, initializer=_init_worker) as pool:
+            results = dict(pool.imap_unordered(_generate_in_worker, user_ids))
+
+    else:
+        results = {user_id: generate_user_briefing_isolated(app, user_id, topic_model, similarity_threshold,
+                                                            ranking_state, summarize)
+                   for user_id in user_ids}
+
+    failed = [user_id for user_id, nr_items in results.items() if nr_items is None]
+    app.logger.info(f'Generated briefings for {len(results) - len(failed)} users, failed for users: {failed}.')
+
+    return results
+
+
 def generate_briefing():
     # Set up app context to be able to access extensions such as SQLAlchemy when this module is run independently
     app = create_app()
@@ -69,42 +229,18 @@ def generate_briefing():
 
         if args.All:
 
-            users = get_all_users()
+            user_ids = [user.id for user in get_all_users()]
 
         else:
 
-            users = [get_user_by_id(user_id) for user_id in args.user_ids]
+            user_ids = [int(user_id) for user_id in args.user_ids]
 
         # Compute the current trending topics
-        topic_model = compute_topics(app)
-
-        app.logger.info(f'Generating briefing for users {users}...')
-
-        for user in users:
-            app.logger.info(f'Generating briefing for user {user}...')
-
-            candidates = get_candidates(app, user.id)
-
-            candidates = filter_posts(candidates)
-
-            selected = rank_candidates(app, candidates, topic_model, args.similarity_threshold)
-
-            selected = enrich_with_summary(app, selected)
+        topic_model = load_latest_topics(app) if args.stored_model else compute_topics(app)
 
-            app.logger.info(f'The chosen briefing items are:')
-            for post in selected:
-                app.logger.info('----------------------------------------------------')
-                app.logger.info(f'Post title: \n{post.title}')
-                app.logger.info('----------------------------------------------------')
-                app.logger.info(f'Post description: \n{post.description}')
-                app.logger.info(f'Post summary: \n{post.summary}')
-                app.logger.info(
-                    f'Post topic id {post.reference}, ranked {post.guid}: \n {topic_model.print_topic(int(post.reference), topn=10)}')
-                app.logger.info(f'topic probability: \n{post.score}')
+        app.logger.info(f'Generating briefing for users {user_ids}...')
 
-            app.logger.info(f'Writing {len(selected)} briefing items for user {user} to DB...')
-            save_to_db(selected)
-            app.logger.info('DB write done.')
+        generate_briefings(app, user_ids, topic_model, args.similarity_threshold, args.multi_user, args.workers)
 
     except:
         app.logger.error('Unhandled exception', exc_info=sys.exc_info())
@@ -37,6 +37,11 @@ reference_feeds = [
 stop_words = ["Mrs.", "Ms.", "Mr.", "say", "WASHINGTON", "'s", "’"]
 stop_words_to_remove = ["show"]
 
+# spaCy batch processing with nlp.pipe: only lemmas and lexical flags are used, thus parser and NER are disabled
+SPACY_BATCH_SIZE = 256
+SPACY_N_PROCESS = 1
+SPACY_DISABLED_COMPONENTS = ["parser", "ner"]
+
 # Common terms for gensim's Phrases
 common_terms = ("bank_of_america", "new_york", "united_states", "talk_show")
 
@@ -44,6 +49,26 @@ common_terms = ("bank_of_america", "new_york", "united_states", "talk_show")
 NUM_TOPICS = 18
 PASSES = 30
 
+# Trainer of the LDA model: 'lda' (single core) or 'lda_multicore' (gensim's LdaMulticore with TOPIC_MODEL_WORKERS
+# worker processes, None for one less than the number of CPU cores)
+TOPIC_MODEL_BACKEND = 'lda'
+TOPIC_MODEL_WORKERS = None
+
+# Incremental LDA updates: between full retrains, the previous model is updated with the posts that arrived since the
+# last run only, with the vocabulary of the previous dictionary
+TOPIC_MODEL_INCREMENTAL = True
+# Full retrain once the last one is older than this, thus a daily run always retrains in full
+TOPIC_MODEL_RETRAIN_HOURS = 23
+# Full retrain if the share of tokens of the new posts missing in the dictionary exceeds the one of the training
+# corpus by more than this
+TOPIC_MODEL_OOV_DRIFT_THRESHOLD = 0.1
+# Learning rate decay (kappa) of the updates in (0.5, 1], lower values weight the new posts higher against the state
+# learned from older posts, see gensim's LdaModel.update()
+TOPIC_MODEL_DECAY = 0.5
+TOPIC_MODEL_UPDATE_PASSES = 5
+# Number of stored topic model versions kept on disk, see data_structures.TopicModel
+TOPIC_MODEL_KEEP_VERSIONS = 5
+
 # RSS/Atom feeds to discard for briefing generation
 DISCARD_FEEDS = ["Bloomberg.com", "Bloomberg Politics", "The Independent - World"]
 DISCARD_LIVE_POSTS = ["coronavirus-usa-world", "coronavirus-live-updates"]
@@ -66,3 +91,25 @@ SUMMARIZATION_MODEL = "bart-large-cnn"
 TOKENIZER = "facebook/bart-large-cnn"
 MIN_LENGTH = 190
 MAX_LENGTH = 300
+# Max number of input tokens of the model, longer articles are not summarized
+MAX_INPUT_LENGTH = 1024
+# Number of articles per forward pass, articles of similar token length are batched together to limit padding
+SUMMARIZATION_BATCH_SIZE = 4
+# Dynamically quantize the linear layers of the summarization model to int8 for faster CPU inference and less memory
+SUMMARIZATION_QUANTIZED = False
+# Number of downloaded articles collected before they're sorted by token length and summarized in batches
+SUMMARIZATION_WINDOW = 8
+
+# Article download stage of the summarization, runs in worker threads concurrently with the inference
+ARTICLE_DOWNLOAD_WORKERS = 8
+ARTICLE_DOWNLOAD_PER_HOST = 2
+ARTICLE_DOWNLOAD_TIMEOUT = 10
+# Max number of downloaded articles waiting for the inference, the downloads pause while the queue is full
+ARTICLE_QUEUE_SIZE = 16
+
+# Summary cache: a cached summary is reused without downloading the article again within the TTL. After the TTL the
+# article is downloaded again and only summarized if its preprocessed text changed.
+SUMMARY_CACHE_TTL_HOURS = 12
+# Entries not used for this many days are evicted, beyond the max number of entries the least recently used ones
+SUMMARY_CACHE_MAX_AGE_DAYS = 7
+SUMMARY_CACHE_MAX_ENTRIES = 10000
@@ -1,20 +1,145 @@
-from gensim.models import LdaModel
+import json
+import os
+import shutil
+from datetime import datetime
 
-models_dict = {'lda': LdaModel}
+from gensim.corpora import Dictionary
+from gensim.models import LdaModel, LdaMulticore
 
+from rssbriefing.briefing_model.configs import TOPIC_MODEL_KEEP_VERSIONS
+from rssbriefing.briefing_model.model_registry import get_model
 
-class TopicModel():
-    def __init__(self, model_name, path):
-        self.path = path
+models_dict = {'lda': LdaModel, 'lda_multicore': LdaMulticore}
+
+module_path = os.path.abspath(os.path.dirname(__file__))
+
+# Large arrays of the LDA model and of its state, stored as separate .npy files to be memory-mapped on load. LdaModel
+# .save doesn't pass `separately` on to the save of its state, thus the state is saved once more on its own.
+SEPARATE_ARRAYS = ['expElogbeta']
+SEPARATE_STATE_ARRAYS = ['sstats']
+
+
+class TopicModel:
+    """ Versioned on-disk store of the topic model and its metadata.
+
+    Each save writes a new version directory, which is never modified afterwards, and then points the LATEST file to
+    it. The large arrays of a model are stored as separate .npy files and memory-mapped read-only on load, thus all
+    processes loading the same version (briefing workers, web workers, later runs) share one copy of the model in the
+    OS page cache.
+
+    A version holds the dictionary the model was trained or updated with, thus a model is always used with its own
+    vocabulary.
+
+    Layout: <path>/<version>/model[.expElogbeta.npy, .state, .state.sstats.npy], <path>/<version>/dictionary,
+            <path>/<version>/metadata.json, <path>/LATEST
+    """
 
+    def __init__(self, model_name='lda', path=os.path.join(module_path, 'models', 'topic_model')):
         assert model_name in models_dict, f"Model name has to be one of: {[key for key in models_dict.keys()]}"
-        self.model = models_dict[model_name]
+        self.model_class = models_dict[model_name]
+        self.path = path
+
+    def _version_path(self, version, file_name=''):
+        return os.path.join(self.path, version, file_name)
+
+    def versions(self):
+        """ :return: [Lst[Str]] stored versions, oldest first """
+        if not os.path.isdir(self.path):
+            return []
+
+        return sorted(entry for entry in os.listdir(self.path)
+                      if os.path.isfile(self._version_path(entry, 'metadata.json')))
+
+    def latest_version(self):
+        """ :return: [Str] the latest stored version, None if no model was stored yet """
+        try:
+            with open(os.path.join(self.path, 'LATEST')) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def save(self, model, dictionary, metadata, version=None):
+        """ Store a model with its dictionary and metadata as a new version and make it the latest one.
+
+        :param model: [gensim.models.LdaModel]
+        :param dictionary: [gensim.corpora.dictionary.Dictionary]
+        :param metadata: [Dict] JSON serializable, e.g. training window, corpus size and coherence
+        :param version: [Str] opt. defaults to the current UTC time
+        :return version: [Str]
+        :raise FileExistsError: if the version was already stored, stored versions are never overwritten
+        """
+        version = version or datetime.utcnow().strftime('%Y-%m-%dT%H-%M-%S-%f')
+        os.makedirs(self.path, exist_ok=True)
+        os.mkdir(self._version_path(version))
+
+        model.save(self._version_path(version, 'model'), separately=SEPARATE_ARRAYS)
+        # Overwrites the state pickled by model.save, LdaModel.load passes mmap on to the load of the state
+        model.state.save(self._version_path(version, 'model.state'), separately=SEPARATE_STATE_ARRAYS)
+        dictionary.save(self._version_path(version, 'dictionary'))
+
+        with open(self._version_path(version, 'metadata.json'), 'w') as f:
+            json.dump(dict(metadata, version=version), f, indent=2)
+
+        # Switch to the new version atomically, readers see either the previous or the new version
+        latest_tmp = os.path.join(self.path, 'LATEST.tmp')
+        with open(latest_tmp, 'w') as f:
+            f.write(version)
+        os.replace(latest_tmp, os.path.join(self.path, 'LATEST'))
+
+        self.prune()
+
+        return version
+
+    def load(self, version=None, mmap='r'):
+        """ Load a stored model.
+
+        :param version: [Str] opt. defaults to the latest version
+        :param mmap: [Str] 'r' to memory-map the large arrays read-only, None to load a private, writable copy, e.g.
+                     to update the model
+        :return model: [gensim.models.LdaModel]
+        """
+        version = version or self.latest_version()
+
+        return self.model_class.load(self._version_path(version, 'model'), mmap=mmap)
+
+    def load_dictionary(self, version=None):
+        """ :return: [gensim.corpora.dictionary.Dictionary] dictionary of a stored version, None if the version was
+                    stored without one """
+        version = version or self.latest_version()
+
+        try:
+            return Dictionary.load(self._version_path(version, 'dictionary'))
+        except FileNotFoundError:
+            return None
+
+    def load_metadata(self, version=None):
+        """ :return: [Dict] metadata of a stored version, None if no model was stored yet """
+        version = version or self.latest_version()
+        if version is None:
+            return None
+
+        with open(self._version_path(version, 'metadata.json')) as f:
+            return json.load(f)
+
+    def prune(self, keep=TOPIC_MODEL_KEEP_VERSIONS):
+        """ Delete all but the latest keep versions. Processes which still map an old version keep reading it, since
+        the files of deleted versions live on until they are unmapped. """
+        latest = self.latest_version()
+
+        for version in self.versions()[:-keep]:
+            if version != latest:
+                shutil.rmtree(self._version_path(version), ignore_errors=True)
+
+
+def get_topic_model(store=None, version=None):
+    """ The memory-mapped topic model of a stored version, loaded only once per process.
 
-    def train(self):
-        self.model = self.model()
+    :param store: [TopicModel] opt. defaults to the default store
+    :param version: [Str] opt. defaults to the latest version
+    :return: [gensim.models.LdaModel]
+    """
+    store = store or TopicModel()
+    version = version or store.latest_version()
 
-    def load(self, path=self.path):
-        self.model = self.model.load(path)
+    return get_model('topic_model', version, lambda: store.load(version))
 
-    def save(self, path=self.path):
-        self.model.save(path)
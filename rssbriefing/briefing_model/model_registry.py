@@ -0,0 +1,53 @@
+"""
+    Process-level registry of the model artifacts of a briefing run
+
+    Artifacts (gensim Dictionary, Phrases model, spaCy language model, ...) are registered under a name and a version,
+    e.g. the date of the training run, and are loaded from disk at most once per process. Training steps register the
+    artifacts they create, so that later steps of the same run reuse them instead of reloading them from disk.
+
+"""
+import threading
+from datetime import datetime
+
+_models = {}
+_lock = threading.RLock()
+
+
+def current_version():
+    """ Version of the artifacts of today's run, matching the date suffix of the saved model files. """
+    return datetime.now().strftime('%Y-%m-%d')
+
+
+def get_model(name, version, loader):
+    """ Get a registered artifact, loading and registering it with loader() on first access.
+
+    :param name: [Str] e.g. 'dictionary'
+    :param version: [Str] e.g. current_version()
+    :param loader: [callable] without arguments, returning the artifact
+    :return: the artifact
+    """
+    with _lock:
+        if (name, version) not in _models:
+            _models[(name, version)] = loader()
+
+        return _models[(name, version)]
+
+
+def register_model(name, version, model):
+    """ Register an artifact, replacing a previously registered one of the same name and version. """
+    with _lock:
+        _models[(name, version)] = model
+
+
+def invalidate(name=None, version=None, keep=()):
+    """ Drop registered artifacts, so that the next access reloads them from disk.
+
+    Without arguments all artifacts are dropped, with a name all versions of that artifact, with name and version
+    only that one.
+
+    :param keep: [Tuple[Str]] names of artifacts to keep in any case, e.g. models which don't depend on the training run
+    """
+    with _lock:
+        for key in list(_models):
+            if (name is None or key[0] == name) and (version is None or key[1] == version) and key[0] not in keep:
+                del _models[key]
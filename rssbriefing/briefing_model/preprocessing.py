@@ -2,6 +2,7 @@
     Module with functions for preprocessing
 
 """
+import hashlib
 import os
 import re
 from datetime import datetime
@@ -13,47 +14,91 @@ from spacy.lang.en import English
 from spacy.lang.en.stop_words import STOP_WORDS
 
 from rssbriefing.briefing_model.configs import stop_words, stop_words_to_remove, common_terms, \
-    SUMM_PREPROCESSING_PHRASES, SUMM_PREPROCESSING_REGEXES, SUMM_PREPROCESSING_RAW_TEXT_REGEXES, REPLACEMENTS
+    SUMM_PREPROCESSING_PHRASES, SUMM_PREPROCESSING_REGEXES, SUMM_PREPROCESSING_RAW_TEXT_REGEXES, REPLACEMENTS, \
+    SPACY_BATCH_SIZE, SPACY_N_PROCESS, SPACY_DISABLED_COMPONENTS
+from rssbriefing.briefing_model.model_registry import current_version, get_model, register_model
 
 module_path = os.path.abspath(os.path.dirname(__file__))
 
 
-def preprocess_for_summarization(doc):
-    """ Preprocessing step after scraping of article and before passing the scraped text to summarization model.
+class SummarizationCleaner:
+    """ Cleanup of a scraped article before it is passed to the summarization model, with all patterns compiled once.
 
         - Filter out parts of the raw scraped document based on regexes
-        - Remove newline characters
+        - Replace characters, e.g. remove newline characters
         - Second filtering based on regexes
-        - Filter out phrases
+        - Filter out the first occurrence of each phrase
+
+    Each step is a single linear pass per pattern over the document. A regex starting with a greedy match-anything
+    prefix (and without alternation) matches at the start of the document or nowhere, thus it is applied there only
+    instead of being retried, at quadratic cost, at every position.
+    """
+
+    GREEDY_PREFIX = r'[\s\S]*'
+
+    def __init__(self, raw_text_regexes, replacements, regexes, phrases):
+        self.raw_text_regexes = [self._compile(regex) for regex in raw_text_regexes]
+        self.regexes = [self._compile(regex) for regex in regexes]
+        self.phrases = list(phrases)
+
+        # Single character replacements, which don't feed into each other, are applied in one pass by str.translate
+        sources = {old for old, _ in replacements}
+        if len(sources) == len(replacements) and all(len(old) == 1 for old in sources) \
+                and not any(old in new for old in sources for _, new in replacements):
+            self.translation = str.maketrans(dict(replacements))
+            self.replacements = []
+        else:
+            self.translation = None
+            self.replacements = list(replacements)
+
+    @classmethod
+    def _compile(cls, regex):
+        anchored = regex.startswith(cls.GREEDY_PREFIX) and not regex.startswith(cls.GREEDY_PREFIX + '?') \
+            and '|' not in regex
+        return re.compile(regex), anchored
+
+    @staticmethod
+    def _remove_matches(doc, regexes):
+        for pattern, anchored in regexes:
+            if anchored:
+                match = pattern.match(doc)
+                if match:
+                    doc = doc[match.end():]
+            else:
+                doc = pattern.sub('', doc)
+        return doc
+
+    def clean(self, doc):
+        """
+        :param doc: [Str]
+        :return doc: [Str]
+        """
+        doc = self._remove_matches(doc, self.raw_text_regexes)
+
+        if self.translation:
+            doc = doc.translate(self.translation)
+        for old, new in self.replacements:
+            doc = doc.replace(old, new)
+
+        doc = self._remove_matches(doc, self.regexes)
+
+        for phrase in self.phrases:
+            doc = doc.replace(phrase, '', 1)
+        return doc
+
+
+summarization_cleaner = SummarizationCleaner(SUMM_PREPROCESSING_RAW_TEXT_REGEXES, REPLACEMENTS,
+                                             SUMM_PREPROCESSING_REGEXES, SUMM_PREPROCESSING_PHRASES)
+
+
+def preprocess_for_summarization(doc):
+    """ Preprocessing step after scraping of article and before passing the scraped text to summarization model,
+    see SummarizationCleaner.
 
     :param doc: [Str]
     :return doc: [Str]
     """
-    for regex in SUMM_PREPROCESSING_RAW_TEXT_REGEXES:
-        matches = re.findall(regex, doc)
-        if matches:
-            for match in matches:
-                start_index = doc.find(match)
-                end_index = start_index + len(match)
-                doc = doc[:start_index] + doc[end_index:]
-
-    for replacement_tuple in REPLACEMENTS:
-        doc = doc.replace(replacement_tuple[0], replacement_tuple[1])
-
-    for regex in SUMM_PREPROCESSING_REGEXES:
-        matches = re.findall(regex, doc)
-        if matches:
-            for match in matches:
-                start_index = doc.find(match)
-                end_index = start_index + len(match)
-                doc = doc[:start_index] + doc[end_index:]
-
-    for phrase in SUMM_PREPROCESSING_PHRASES:
-        start_index = doc.find(phrase)
-        if start_index is not -1:
-            end_index = start_index + len(phrase)
-            doc = doc[:start_index] + doc[end_index:]
-    return doc
+    return summarization_cleaner.clean(doc)
 
 
 def preprocess(post, phrases, nlp):
@@ -67,6 +112,15 @@ def preprocess(post, phrases, nlp):
     return doc
 
 
+def preprocess_posts(posts, phrases, nlp):
+    """ Batched version of preprocess() for a list of documents.
+
+    :param posts: [Lst[rssbriefing.models.Briefing]]
+    :return: corpus: [Lst[Lst[str]]]
+    """
+    return [predict_bigrams(doc, phrases) for doc in preprocess_documents(posts, nlp, cache=get_token_cache())]
+
+
 def initiate_language_model():
     nlp = en_core_web_sm.load()
 
@@ -87,6 +141,11 @@ def initiate_language_model():
     return nlp
 
 
+def get_language_model():
+    """ The customized spaCy language model, initiated (and written to disk) only once per process and day. """
+    return get_model('language_model', current_version(), initiate_language_model)
+
+
 def load_language_model():
     return English().from_disk(
         os.path.join(module_path, "models", f"spaCy_language_model_{datetime.now().strftime('%Y-%m-%d')}"))
@@ -98,28 +157,19 @@ def load_language_model():
 #
 #     return doc
 
-def preprocess_document(post, nlp):
-    """ Perform preprocessing on a single document.
-
-    Preprocessing covers:
-        - Normalization: lowering all string
-        - Tokenization
-        - Lemmatization
-        - custom filtering
-
-    :param post: [rssbriefing.models.Briefing]
-    :param nlp:
-    :return:
-    """
-
+def get_text(post):
+    """ Normalized text of a post: title and description, lowered. """
     doc = post.title + ' ' + post.description
 
-    doc = doc.lower()
+    return doc.lower()
 
-    doc = nlp(doc)
 
-    # doc = entity_recognition(doc)
+def filter_tokens(doc):
+    """ Lemmatize a spaCy Doc and apply the custom filtering of tokens.
 
+    :param doc: [spacy.tokens.Doc]
+    :return: [Lst[str]]
+    """
     doc = [word.lemma_ for word in doc
            if word.text != '\n' and
            word.text != '\n ' and
@@ -137,15 +187,79 @@ def preprocess_document(post, nlp):
     return doc
 
 
+def preprocess_document(post, nlp):
+    """ Perform preprocessing on a single document.
+
+    Preprocessing covers:
+        - Normalization: lowering all string
+        - Tokenization
+        - Lemmatization
+        - custom filtering
+
+    :param post: [rssbriefing.models.Briefing]
+    :param nlp:
+    :return:
+    """
+    doc = nlp(get_text(post))
+
+    # doc = entity_recognition(doc)
+
+    return filter_tokens(doc)
+
+
+def token_cache_key(post):
+    """ Key of a post in the token cache: the id of the underlying Item (if known) and a hash of the post text. """
+    return getattr(post, 'item_id', None), hashlib.sha1(get_text(post).encode('utf-8')).hexdigest()
+
+
+def get_token_cache():
+    """ Token cache of the current run, shared by topic model training and candidate ranking.
+
+    Maps token_cache_key() to the lemmatized tokens of a post, see preprocess_documents(). It lives in the model
+    registry and is therefore dropped together with the other artifacts at the start of the next training run.
+    """
+    return get_model('token_cache', current_version(), dict)
+
+
+def preprocess_documents(posts, nlp, batch_size=SPACY_BATCH_SIZE, n_process=SPACY_N_PROCESS, cache=None):
+    """ Batched version of preprocess_document() with spaCy's nlp.pipe.
+
+    Pipeline components whose annotations aren't used (parser, NER) are disabled, the tagger stays enabled since
+    the lemmatizer depends on the part-of-speech tags.
+
+    :param posts: [Lst[rssbriefing.models.Briefing]]
+    :param nlp:
+    :param batch_size: [int] number of texts per batch
+    :param n_process: [int] number of processes, -1 for all CPUs
+    :param cache: [Dict] opt. token cache, see get_token_cache(). Only posts missing in the cache are processed.
+    :return: corpus: [Lst[Lst[str]]]
+    """
+    cache = {} if cache is None else cache
+
+    keys = [token_cache_key(post) for post in posts]
+    missing = {key: post for key, post in zip(keys, posts) if key not in cache}
+
+    docs = nlp.pipe((get_text(post) for post in missing.values()),
+                    batch_size=batch_size,
+                    n_process=n_process,
+                    disable=SPACY_DISABLED_COMPONENTS)
+
+    for key, doc in zip(missing, docs):
+        cache[key] = filter_tokens(doc)
+
+    # Return copies, since the bigram steps append to the token lists in place
+    return [list(cache[key]) for key in keys]
+
+
 def tokenize_and_lemmatize(posts):
     """
 
     :param posts: [Lst[rssbriefing.models.Briefing]]
     :return:
     """
-    nlp = initiate_language_model()
+    nlp = get_language_model()
 
-    corpus = [preprocess_document(post, nlp) for post in posts]
+    corpus = preprocess_documents(posts, nlp, cache=get_token_cache())
 
     return corpus
 
@@ -164,6 +278,9 @@ def train_phrases(tokenized_corpus):
         bigram.add_vocab(tokenized_corpus)
         save_phrases(bigram)
 
+    # Make the updated model available to the ranking step of the same run
+    register_model('phrases', current_version(), bigram)
+
     return bigram
 
 
@@ -213,17 +330,33 @@ def get_dictionary(corpus):
     # Filter out words that occur less than 4 documents, or more than 60% of the documents.
     dictionary.filter_extremes(no_below=4, no_above=0.6)
 
-    dictionary.save(os.path.join(module_path, "models", f"dictionary_{datetime.now().strftime('%Y-%m-%d')}"))
+    save_dictionary(dictionary)
 
     return dictionary
 
 
+def save_dictionary(dictionary):
+    """ Save the dictionary as the one of today's run and make it available to the ranking step of the same run.
+    The topic model store keeps its own copy per model version, see data_structures.TopicModel. """
+    file_name = f"dictionary_{datetime.now().strftime('%Y-%m-%d')}"
+    dictionary.save(os.path.join(module_path, "models", file_name))
+
+    register_model('dictionary', current_version(), dictionary)
+
+
 def load_current_dictionary():
     return Dictionary.load(os.path.join(module_path, "models", f"dictionary_{datetime.now().strftime('%Y-%m-%d')}"))
 
 
 def collect_latest_models():
-    dictionary = load_current_dictionary()
-    phrases = load_phrases()
-    language_model = load_language_model()
+    """ Get the dictionary, Phrases model and spaCy language model of today's run from the model registry.
+
+    Each artifact is loaded from disk only if it wasn't registered yet by the training step or a previous call,
+    thus the first call of a run pays the load cost and all further calls (one per user) reuse the loaded models.
+    """
+    version = current_version()
+
+    dictionary = get_model('dictionary', version, load_current_dictionary)
+    phrases = get_model('phrases', version, load_phrases)
+    language_model = get_model('language_model', version, load_language_model)
     return dictionary, phrases, language_model
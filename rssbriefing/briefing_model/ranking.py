@@ -1,10 +1,39 @@
 import collections
 from datetime import datetime, timedelta
+from itertools import chain
 from tqdm import tqdm
+import numpy as np
 import pytz
 
-from rssbriefing.briefing_model.preprocessing import preprocess, load_current_dictionary, collect_latest_models
-from rssbriefing.models import Item, Feed, Users, Briefing
+from rssbriefing import db
+from rssbriefing.briefing_model.preprocessing import preprocess_posts, collect_latest_models
+from rssbriefing.models import Item, Feed, Users, Briefing, user_feed
+
+
+def to_briefing_item(item, user_id):
+    """ Instantiate a new Briefing item from a feed Item, as data structure for processing of the briefing
+    and final write back to db.
+
+    The Item guid is a dedup key and not carried over, since the Briefing guid holds the topic ranking.
+
+    :param item: [rssbriefing.models.Item] or [rssbriefing.models.Briefing] to copy
+    :param user_id: [int]
+    :return: [rssbriefing.models.Briefing]
+    """
+    briefing_item = Briefing(
+        title=item.title,
+        description=item.description,
+        link=item.link,
+        reference='None',
+        score=0.0,
+        created=item.created,
+        feed_title=item.feed_title if isinstance(item, Briefing) else item.feed.title,
+        user_id=user_id
+    )
+    # Transient attribute (no column), the key of the post in the per-run token cache of the preprocessing
+    briefing_item.item_id = getattr(item, 'item_id', None) if isinstance(item, Briefing) else item.id
+
+    return briefing_item
 
 
 def get_candidates(app, user_id):
@@ -26,34 +55,124 @@ def get_candidates(app, user_id):
         filter(Users.id == user_id). \
         filter(Item.created > datetime_24h_ago).all()
 
-    # Instantiate new Briefing items as data structure for processing of the briefing
-    # and final write back to db
-    candidates = [Briefing(
-        title=item.title,
-        description=item.description,
-        link=item.link,
-        reference='None',
-        score=0.0,
-        created=item.created,
-        guid=item.guid,
-        feed_title=item.feed.title,
-        user_id=user_id
-    ) for item in candidates]
+    candidates = [to_briefing_item(item, user_id) for item in candidates]
 
     app.logger.info(f'Fetched {len(candidates)} candidates.')
 
     return candidates
 
 
-def query_most_similar_reference(briefing_item, model, dictionary, phrases, language_model):
+def get_candidates_for_users(app, user_ids):
+    """ Collect RSS/Atom posts from last 24h of the feeds of all given users, each post only once.
+
+    :param app: [flask.Flask] The flask object implements a WSGI application
+    :param user_ids: [Lst[int]]
+    :return candidates: [Lst[rssbriefing.models.Briefing]] without user_id, see to_briefing_item()
+    :return subscriptions: [Dict[int, Set[str]]] feed titles per user_id
+    """
+    app.logger.info(f'Getting briefing candidates from last 24h for {len(user_ids)} users...')
+
+    subscriptions = {user_id: set() for user_id in user_ids}
+    for user_id, feed_title in db.session.query(user_feed.c.user_id, Feed.title). \
+            join(Feed, Feed.id == user_feed.c.feed_id). \
+            filter(user_feed.c.user_id.in_(user_ids)):
+        subscriptions[user_id].add(feed_title)
+
+    datetime_24h_ago = datetime.now(pytz.utc) - timedelta(days=1)
+    feed_titles = set(chain.from_iterable(subscriptions.values()))
+
+    items = Item.query. \
+        join(Feed). \
+        filter(Feed.title.in_(feed_titles)). \
+        filter(Item.created > datetime_24h_ago).all() if feed_titles else []
+
+    candidates = [to_briefing_item(item, user_id=None) for item in items]
+
+    app.logger.info(f'Fetched {len(candidates)} distinct candidates.')
+
+    return candidates, subscriptions
+
+
+def infer_topic_distributions(app, candidates, model):
+    """ Infer the topic distributions of all candidates with one batched inference call of the topic model.
+
+    :param app: [flask.Flask] The flask object implements a WSGI application
+    :param candidates: [Lst[rssbriefing.models.Briefing]]
+    :param model: [gensim.models.LdaModel] the trained topic model
+    :return: [numpy.ndarray] dense doc-topic matrix of shape (len(candidates), num_topics), rows of candidates
+             with an empty bag-of-words representation are all zero
+    """
+    app.logger.info(f'Inferring topic distributions of {len(candidates)} candidates ...')
+
+    dictionary, phrases, language_model = collect_latest_models()
+
+    tokenized_docs = preprocess_posts(candidates, phrases, language_model)
+    bows = [dictionary.doc2bow(doc) for doc in tokenized_docs]
+
+    # If the bag-of-words vector is empty, it doesn't make sense to calculate a probability distribution
+    rows = [idx for idx, bow in enumerate(bows) if bow]
+
+    topic_matrix = np.zeros((len(candidates), model.num_topics))
+
+    if rows:
+        gamma, _ = model.inference([bows[idx] for idx in rows])
+        topic_matrix[rows] = gamma / gamma.sum(axis=1, keepdims=True)
+
+    return topic_matrix
+
+
+def group_rows_by_feed(candidates):
+    """ Row indices of the doc-topic matrix per feed title, to index into it with the subscriptions of a user. """
+    rows_by_feed = collections.defaultdict(list)
+    for idx, candidate in enumerate(candidates):
+        rows_by_feed[candidate.feed_title].append(idx)
+
+    return rows_by_feed
+
+
+def rank_user_candidates(app, user_id, feed_titles, candidates, rows_by_feed, topic_matrix, model,
+                         probability_threshold=None, nr_topics=10):
+    """ Rank the candidates of a single user with the topic distributions inferred for all users.
+
+    :param app: [flask.Flask] The flask object implements a WSGI application
+    :param user_id: [int]
+    :param feed_titles: [Set[str]] feed subscriptions of the user
+    :param candidates: [Lst[rssbriefing.models.Briefing]] candidates of all users, see get_candidates_for_users()
+    :param rows_by_feed: [Dict[str, Lst[int]]] see group_rows_by_feed()
+    :param topic_matrix: [numpy.ndarray] see infer_topic_distributions()
+    :param model: [gensim.models.LdaModel] the trained topic model
+    :param probability_threshold: [float] optional condition of a minimum threshold for the similarity score
+    :return: [Lst[rssbriefing.models.Briefing]] new Briefing items of the user
+    """
+    rows = sorted(chain.from_iterable(rows_by_feed.get(feed_title, []) for feed_title in feed_titles))
+
+    user_matrix = topic_matrix[rows]
+    top_topics = user_matrix.argmax(axis=1)
+    top_scores = user_matrix.max(axis=1)
+
+    user_candidates = []
+    for idx, topic_id, probability in zip(rows, top_topics, top_scores):
+        candidate = to_briefing_item(candidates[idx], user_id)
+
+        # All-zero rows belong to candidates without a topic distribution
+        if probability > 0:
+            candidate.reference = str(topic_id)
+            candidate.score = float(probability)
+
+        user_candidates.append(candidate)
+
+    return select_candidates(app, user_candidates, model, probability_threshold, nr_topics)
+
+
+def query_most_similar_reference(briefing_item, tokenized_doc, model, dictionary):
     """ Get the topic with the highest probability score for a given briefing_item. Update briefing item attributes.
 
     :param briefing_item: [rssbriefing.models.Briefing] representing an rss feed entry considered a candidate for final briefing
-    :param model: [gensim.models.doc2vec.Doc2Vec] trained Doc2Vec model
+    :param tokenized_doc: [Lst[str]] the preprocessed briefing_item, see preprocessing.preprocess
+    :param model: [gensim.models.LdaModel] the trained topic model
     :return:
     """
 
-    tokenized_doc = preprocess(briefing_item, phrases, language_model)
     bow_representation = dictionary.doc2bow(tokenized_doc)
 
     # If the bag-of-words vector is empty, it doesn't make sense to calculate a probability distribution
@@ -109,9 +228,27 @@ def rank_candidates(app, candidates, model, probability_threshold=None, nr_topic
     app.logger.info('Enriching candidates w most likely topic ...')
 
     dictionary, phrases, language_model = collect_latest_models()
-    for candidate in tqdm(candidates):
-        query_most_similar_reference(candidate, model, dictionary, phrases, language_model)
 
+    # Preprocess all candidates in batches with spaCy's nlp.pipe
+    tokenized_docs = preprocess_posts(candidates, phrases, language_model)
+
+    for candidate, tokenized_doc in tqdm(zip(candidates, tokenized_docs), total=len(candidates)):
+        query_most_similar_reference(candidate, tokenized_doc, model, dictionary)
+
+    return select_candidates(app, candidates, model, probability_threshold, nr_topics)
+
+
+def select_candidates(app, candidates, model, probability_threshold=None, nr_topics=10):
+    """ Select the subset of candidates, enriched with their most likely topic, which best represent the top trending
+    nr_topics: the highest scoring candidate per topic.
+
+    :param app: [flask.Flask] The flask object implements a WSGI application
+    :param candidates: [Lst[rssbriefing.models.Briefing]] with the most likely topic as reference and its probability
+                       as score, reference 'None' for candidates without a topic
+    :param model: [gensim.models.LdaModel] the trained topic model
+    :param probability_threshold: [float] optional condition of a minimum threshold for the similarity score
+    :return: [Lst[rssbriefing.models.Briefing]]
+    """
     assigned_topics = [candidate.reference for candidate in candidates if candidate.reference is not 'None']
     ordered_topics = collections.Counter(assigned_topics).most_common()
     multiple_assignments = [item for item, count in collections.Counter(assigned_topics).items() if count > 1]
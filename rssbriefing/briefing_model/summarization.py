@@ -1,15 +1,32 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import newspaper
+import torch
 from tqdm import tqdm
 from transformers import pipeline, AutoTokenizer
-from rssbriefing.briefing_model.configs import SUMMARIZATION_MODEL, TOKENIZER, MIN_LENGTH, MAX_LENGTH
+from rssbriefing.briefing_model.configs import SUMMARIZATION_MODEL, TOKENIZER, MIN_LENGTH, MAX_LENGTH, \
+    MAX_INPUT_LENGTH, SUMMARIZATION_BATCH_SIZE, SUMMARIZATION_QUANTIZED, SUMMARIZATION_WINDOW, ARTICLE_DOWNLOAD_WORKERS, \
+    ARTICLE_DOWNLOAD_PER_HOST, ARTICLE_DOWNLOAD_TIMEOUT, ARTICLE_QUEUE_SIZE
+from rssbriefing.briefing_model import summary_cache
+from rssbriefing.briefing_model.model_registry import get_model
 from rssbriefing.briefing_model.preprocessing import preprocess_for_summarization
+from rssbriefing.feed import HostLimiter, interleave_by_host
 
 COOKIE_RESPONSE = 'Cookies help us deliver our Services.'
 SEARCH_RESPONSE = 'What term do you want to search?'
 
 
-def get_summary(app, url, nlp, tokenizer):
-    article = newspaper.Article(url)
+def get_article_text(app, url, timeout=ARTICLE_DOWNLOAD_TIMEOUT):
+    """ Download and parse an article and preprocess its text for summarization.
+
+    :param app: [flask.Flask] The flask object implements a WSGI application
+    :param url: [Str]
+    :param timeout: [float] request timeout in seconds
+    :return text: [Str] None if the article couldn't be downloaded or parsed
+    """
+    article = newspaper.Article(url, request_timeout=timeout)
 
     try:
 
@@ -20,39 +37,222 @@ def get_summary(app, url, nlp, tokenizer):
         app.logger.info(f"{'-'*40}\n Obtained original text for summarization:\n {text}\n {'-'*40}")
         text = preprocess_for_summarization(text)
 
-        if (len(tokenizer.tokenize(text)) > 1024) or (len(tokenizer.tokenize(text)) < MIN_LENGTH):
-            return None
-
-        output = nlp(text, max_length=MAX_LENGTH, min_length=MIN_LENGTH)
-        summary = output[0]['summary_text']
-
-        app.logger.info(f"{'-'*40}\n Summary done. Preprocessed text:\n {text}\n {'-'*40}\n Summary: {summary}\n {'-'*40}")
-
     except newspaper.article.ArticleException as a_err:
 
         print(f"Article exception: {a_err}")
-        summary = None
+        text = None
 
     except ValueError as v_err:
 
         print(f"Value error: {v_err}")
-        summary = None
+        text = None
 
-    return summary
+    return text
 
 
-def enrich_with_summary(app, briefing_items):
+def download_articles(app, article_urls, workers=ARTICLE_DOWNLOAD_WORKERS, per_host=ARTICLE_DOWNLOAD_PER_HOST,
+                      timeout=ARTICLE_DOWNLOAD_TIMEOUT, queue_size=ARTICLE_QUEUE_SIZE):
+    """ Download and parse articles concurrently with a bounded pool of worker threads.
+
+    The texts are handed to the calling thread through a bounded queue in order of completion, so that the
+    summarization of the first articles overlaps with the download of the next ones. While the queue is full, the
+    workers wait for the calling thread to catch up.
+
+    :param app: [flask.Flask] The flask object implements a WSGI application
+    :param article_urls: [Lst[tuple(key, Str)]] (key, url) of the articles to download
+    :param workers: [int] max number of concurrent downloads
+    :param per_host: [int] max number of concurrent downloads from the same host
+    :param timeout: [float] request timeout in seconds per article
+    :param queue_size: [int] max number of downloaded articles waiting for the calling thread
+    :return: generator of (key, text) tuples, text is None if the article couldn't be downloaded
+    """
+    limiter = HostLimiter(per_host)
+    articles = queue.Queue(maxsize=queue_size)
+    stopped = threading.Event()
+
+    def download(key, url):
+        try:
+            with limiter.limit(url):
+                text = get_article_text(app, url, timeout)
+
+        except Exception:
+            app.logger.warning(f'Download of article {url} failed', exc_info=True)
+            text = None
+
+        # Stop waiting for a free slot if the calling thread quit early
+        while not stopped.is_set():
+            try:
+                articles.put((key, text), timeout=0.1)
+                break
+            except queue.Full:
+                continue
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = [executor.submit(download, key, url) for key, url in interleave_by_host(article_urls)]
+
+    try:
+        for _ in range(len(futures)):
+            yield articles.get()
+
+    finally:
+        stopped.set()
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def summarize_texts(app, texts, nlp, tokenizer, batch_size=SUMMARIZATION_BATCH_SIZE):
+    """ Summarize texts in batches.
+
+    Each text is tokenized once to check the length bounds of the model. The texts within bounds are sorted by token
+    length and batched in that order, so that each batch holds texts of similar length and little padding.
+
+    :param app: [flask.Flask] The flask object implements a WSGI application
+    :param texts: [Lst[Str]] None for missing texts
+    :param nlp: [transformers.SummarizationPipeline]
+    :param tokenizer: [transformers.PreTrainedTokenizer]
+    :param batch_size: [int] number of texts per forward pass of the model
+    :return summaries: [Lst[Str]] aligned with texts, None for texts which weren't summarized
+    :return failed: [Set[int]] indices of the texts within bounds whose batch failed, those are worth a retry unlike
+                    the texts outside of the length bounds
+    """
+    token_lengths = [len(tokenizer.tokenize(text)) if text else 0 for text in texts]
+
+    in_bounds = [idx for idx, length in enumerate(token_lengths) if MIN_LENGTH <= length <= MAX_INPUT_LENGTH]
+    in_bounds = sorted(in_bounds, key=lambda idx: token_lengths[idx])
+
+    summaries = [None] * len(texts)
+    failed = set()
+
+    for start in tqdm(range(0, len(in_bounds), batch_size)):
+        batch = in_bounds[start:start + batch_size]
+
+        try:
+
+            outputs = nlp([texts[idx] for idx in batch], max_length=MAX_LENGTH, min_length=MIN_LENGTH)
+
+        except ValueError as v_err:
+
+            print(f"Value error: {v_err}")
+            failed.update(batch)
+            continue
+
+        for idx, output in zip(batch, outputs):
+            summaries[idx] = output['summary_text']
+
+            app.logger.info(f"{'-'*40}\n Summary done. Preprocessed text:\n {texts[idx]}\n {'-'*40}\n "
+                            f"Summary: {summaries[idx]}\n {'-'*40}")
+
+    return summaries, failed
+
+
+def summary_model_version(quantized=SUMMARIZATION_QUANTIZED):
+    """ Version of the summarization model and its config, cached summaries of other versions are regenerated. """
+    return f'{SUMMARIZATION_MODEL}{"-int8" if quantized else ""}:{MIN_LENGTH}-{MAX_LENGTH}:{MAX_INPUT_LENGTH}'
 
-    app.logger.info(f'Loading summarization model: {SUMMARIZATION_MODEL} and tokenizer: {TOKENIZER}...')
+
+def load_summarizer(app, quantized=SUMMARIZATION_QUANTIZED):
+    """ Load the summarization pipeline and the tokenizer for its length bounds.
+
+    :param app: [flask.Flask] The flask object implements a WSGI application
+    :param quantized: [Bool] dynamically quantize the linear layers of the model to int8 for CPU inference
+    :return: [tuple(transformers.SummarizationPipeline, transformers.PreTrainedTokenizer)]
+    """
+    app.logger.info(f'Loading summarization model: {SUMMARIZATION_MODEL} (quantized: {quantized}) '
+                    f'and tokenizer: {TOKENIZER}...')
 
     nlp = pipeline('summarization', model=SUMMARIZATION_MODEL)
-    tokenizer = AutoTokenizer.from_pretrained(TOKENIZER)
 
-    app.logger.info(f'Generating summarization for {len(briefing_items)} briefing items:')
+    if quantized:
+        nlp.model = torch.quantization.quantize_dynamic(nlp.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    return nlp, AutoTokenizer.from_pretrained(TOKENIZER)
+
+
+def get_summarizer(app, quantized=SUMMARIZATION_QUANTIZED):
+    """ The summarization pipeline and tokenizer, loaded only once per process on first access.
+
+    :return: [tuple(transformers.SummarizationPipeline, transformers.PreTrainedTokenizer)]
+    """
+    return get_model('summarizer', summary_model_version(quantized), lambda: load_summarizer(app, quantized))
+
+
+def enrich_with_summary(app, briefing_items):
+    """ Enrich the briefing items with a summary of their article.
+
+    Summaries are looked up in the summary cache first. Within its TTL a cached summary is used without downloading
+    the article, after that the article is downloaded and only summarized if its preprocessed text changed.
+
+    The remaining articles are downloaded in worker threads, see download_articles(). Meanwhile this thread
+    summarizes the downloaded ones in windows of SUMMARIZATION_WINDOW articles. The summarization model is only
+    loaded if any article needs to be summarized, and then reused by all later calls in this process.
+
+    :param app: [flask.Flask] The flask object implements a WSGI application
+    :param briefing_items: [Lst[rssbriefing.models.Briefing]]
+    :return: [Lst[rssbriefing.models.Briefing]]
+    """
+    model_version = summary_model_version()
+
+    urls = [summary_cache.normalize_url(item.link) for item in briefing_items]
+    entries = summary_cache.get_cache_entries(urls)
+
+    summaries = [None] * len(briefing_items)
+    to_download = []
+
+    for idx, url in enumerate(urls):
+
+        if url in entries and summary_cache.is_fresh(entries[url], model_version):
+            summaries[idx] = entries[url].summary
+        else:
+            to_download.append(idx)
+
+    app.logger.info(f'Summary cache hits: {len(briefing_items) - len(to_download)}. '
+                    f'Downloading and summarizing {len(to_download)} articles:')
+
+    unchanged = []
+    window = {}
+
+    def summarize_window():
+        nlp, tokenizer = get_summarizer(app)
+
+        new_summaries, failed = summarize_texts(app, list(window.values()), nlp, tokenizer)
+
+        for window_idx, ((idx, text), summary) in enumerate(zip(window.items(), new_summaries)):
+            summaries[idx] = summary
+
+            # Only texts outside of the length bounds are cached without summary, failed batches are retried in the
+            # next run
+            if window_idx not in failed:
+                summary_cache.store_summary(urls[idx], text, model_version, summary)
+
+        window.clear()
+
+    for idx, text in tqdm(download_articles(app, [(idx, briefing_items[idx].link) for idx in to_download]),
+                          total=len(to_download)):
+
+        # Articles which couldn't be downloaded aren't cached, the download is retried in the next run
+        if not text:
+            continue
+
+        entry = entries.get(urls[idx])
+
+        if entry and summary_cache.matches_text(entry, model_version, text):
+            summaries[idx] = entry.summary
+            unchanged.append(entry)
+            continue
+
+        window[idx] = text
+
+        if len(window) >= SUMMARIZATION_WINDOW:
+            summarize_window()
+
+    if window:
+        summarize_window()
 
-    for item in tqdm(briefing_items):
+    summary_cache.touch_checked(unchanged)
+    summary_cache.evict()
 
-        summary = get_summary(app, item.link, nlp, tokenizer)
+    for item, summary in zip(briefing_items, summaries):
 
         if not summary or summary.startswith((COOKIE_RESPONSE, SEARCH_RESPONSE)):
             item.summary = item.description
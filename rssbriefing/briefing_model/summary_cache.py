@@ -0,0 +1,124 @@
+"""
+
+Persistent cache of article summaries, shared by all users and briefing runs
+
+"""
+import hashlib
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from sqlalchemy.exc import IntegrityError
+
+from rssbriefing import db
+from rssbriefing.briefing_model.configs import SUMMARY_CACHE_TTL_HOURS, SUMMARY_CACHE_MAX_AGE_DAYS, \
+    SUMMARY_CACHE_MAX_ENTRIES
+from rssbriefing.models import SummaryCache
+
+# Query parameters which only track the referrer and don't change the article
+TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid', 'cmpid', 'ns_')
+
+
+def normalize_url(url):
+    """ Normalize an article url, such that links to the same article from different feeds share one cache entry.
+
+    Lowercases scheme and host, drops the fragment and tracking query parameters and sorts the remaining ones.
+
+    :param url: [Str]
+    :return: [Str]
+    """
+    parts = urlsplit(url.strip())
+
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if not key.lower().startswith(TRACKING_PARAMS)]
+
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', urlencode(sorted(query)), ''))
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def get_cache_entries(urls):
+    """ Look up the cache entries of the given article urls and mark them as used.
+
+    :param urls: [Lst[Str]] normalized urls
+    :return: [Dict[Str, rssbriefing.models.SummaryCache]]
+    """
+    if not urls:
+        return {}
+
+    entries = SummaryCache.query.filter(SummaryCache.url.in_(set(urls))).all()
+
+    now = datetime.utcnow()
+    for entry in entries:
+        entry.last_used = now
+
+    db.session.commit()
+
+    return {entry.url: entry for entry in entries}
+
+
+def is_fresh(entry, model_version, now=None, ttl_hours=SUMMARY_CACHE_TTL_HOURS):
+    """ Whether the summary of a cache entry can be used without downloading the article again. """
+    now = now or datetime.utcnow()
+
+    return entry.model_version == model_version and entry.checked >= now - timedelta(hours=ttl_hours)
+
+
+def matches_text(entry, model_version, text):
+    """ Whether the summary of a cache entry was generated from the same text by the same model. """
+    return entry.model_version == model_version and entry.text_hash == text_hash(text)
+
+
+def store_summary(url, text, model_version, summary):
+    """ Insert or update the cache entry of an article.
+
+    A concurrent briefing worker may insert the same url in between, in which case this entry is skipped.
+
+    :param url: [Str] normalized url
+    :param text: [Str] preprocessed article text
+    :param model_version: [Str]
+    :param summary: [Str] None if the article couldn't be summarized
+    """
+    now = datetime.utcnow()
+
+    entry = SummaryCache.query.get(url) or SummaryCache(url=url)
+    entry.text_hash = text_hash(text)
+    entry.model_version = model_version
+    entry.summary = summary
+    entry.checked = now
+    entry.last_used = now
+
+    db.session.add(entry)
+
+    try:
+        db.session.commit()
+
+    except IntegrityError:
+        db.session.rollback()
+
+
+def touch_checked(entries):
+    """ Reset the TTL of cache entries whose article was downloaded again and didn't change. """
+    now = datetime.utcnow()
+
+    for entry in entries:
+        entry.checked = now
+
+    db.session.commit()
+
+
+def evict(max_age_days=SUMMARY_CACHE_MAX_AGE_DAYS, max_entries=SUMMARY_CACHE_MAX_ENTRIES):
+    """ Delete the entries not used within max_age_days, then the least recently used entries beyond max_entries.
+
+    :return: [int] number of deleted entries
+    """
+    deleted = SummaryCache.query.filter(
+        SummaryCache.last_used < datetime.utcnow() - timedelta(days=max_age_days)).delete(synchronize_session=False)
+
+    overflow = db.session.query(SummaryCache.url).order_by(SummaryCache.last_used.desc()).offset(max_entries)
+    deleted += SummaryCache.query.filter(SummaryCache.url.in_(overflow.subquery())).delete(synchronize_session=False)
+
+    db.session.commit()
+
+    return deleted
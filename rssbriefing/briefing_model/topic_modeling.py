@@ -1,12 +1,15 @@
 import os
 import numpy as np
-from datetime import datetime
-from gensim.models import LdaModel
+from datetime import datetime, timedelta
 
 from rssbriefing import create_app
-from rssbriefing.briefing_model.preprocessing import tokenize_and_lemmatize, compute_bigrams, get_dictionary
+from rssbriefing.briefing_model.data_structures import TopicModel, get_topic_model, models_dict
+from rssbriefing.briefing_model.model_registry import invalidate, register_model, current_version
+from rssbriefing.briefing_model.preprocessing import tokenize_and_lemmatize, compute_bigrams, get_dictionary, \
+    save_dictionary
 from rssbriefing.briefing_model.configs import reference_feeds, stop_words, stop_words_to_remove, common_terms, \
-    NUM_TOPICS, PASSES, DISCARD_KEYWORDS
+    NUM_TOPICS, PASSES, DISCARD_KEYWORDS, TOPIC_MODEL_BACKEND, TOPIC_MODEL_WORKERS, TOPIC_MODEL_INCREMENTAL, \
+    TOPIC_MODEL_RETRAIN_HOURS, TOPIC_MODEL_OOV_DRIFT_THRESHOLD, TOPIC_MODEL_DECAY, TOPIC_MODEL_UPDATE_PASSES
 from rssbriefing.briefing_model.ranking import get_candidates
 
 
@@ -54,17 +57,24 @@ def get_bow_representation(corpus, dictionary):
     return bow_corpus
 
 
-def train_model(app, bow_corpus, dictionary):
+def train_model(app, bow_corpus, dictionary, backend=TOPIC_MODEL_BACKEND, workers=TOPIC_MODEL_WORKERS):
     """ Initialize and train LDA model. Since no iteration param supplied, it trains until topics converge.
 
     :param corpus:
     :param dictionary:
+    :param backend: [Str] 'lda' for gensim's LdaModel, 'lda_multicore' for LdaMulticore
+    :param workers: [int] number of worker processes of LdaMulticore, None for one less than the number of cores
     :return: model: [gensim.models.LdaModel]
     """
-    app.logger.info(f'Training LDA model with {NUM_TOPICS} topics ...')
+    assert backend in models_dict, f"Backend has to be one of: {list(models_dict)}"
+
+    app.logger.info(f'Training LDA model with {NUM_TOPICS} topics (backend: {backend}) ...')
     temp = dictionary[0]  # Load dictionary into memory, necessary due to lazy evaluation
 
-    model = LdaModel(
+    # LdaMulticore trains in worker processes, LdaModel doesn't take a number of workers
+    backend_kwargs = dict(workers=workers) if backend == 'lda_multicore' else {}
+
+    model = models_dict[backend](
         corpus=bow_corpus,
 
         # id2word: mapping of id -> token/word
@@ -79,7 +89,8 @@ def train_model(app, bow_corpus, dictionary):
         eta='auto',
 
         num_topics=NUM_TOPICS,
-        passes=PASSES
+        passes=PASSES,
+        **backend_kwargs
     )
 
     app.logger.info('Finished training.')
@@ -94,15 +105,36 @@ def show_model_stats(app, model, bow_corpus, corpus, dictionary):
     for idx, topic in enumerate(top_topics):
         app.logger.info(f"Topic {idx + 1}: 'c_v' coherence score: {topic[1]} \n {topic[0]}")
 
+    return avg_topic_coherence
 
-def compute_topics(app):
-    """ Train a LDA topic model on posts from the past 24h.
 
-    :param app: [flask.Flask] object which implements a WSGI application
-    :return: model: [gensim.models.LdaModel] the trained topic model
-    """
-    posts = collect_posts(app)
+def oov_rate(corpus, dictionary):
+    """ Share of the tokens of a corpus which are missing in the dictionary. """
+    tokens = [token for doc in corpus for token in doc]
+    if not tokens:
+        return 0.0
+
+    return sum(token not in dictionary.token2id for token in tokens) / len(tokens)
+
 
+def last_item_id(posts):
+    return max((post.item_id for post in posts if post.item_id is not None), default=0)
+
+
+def training_window(posts, metadata=None):
+    """ Earliest and latest creation time of the posts, extending the window of a previous training if given. """
+    created = [post.created.isoformat() for post in posts if post.created is not None]
+    if metadata:
+        created += [time for time in (metadata['window_start'], metadata['window_end']) if time]
+
+    return dict(window_start=min(created, default=None), window_end=max(created, default=None))
+
+
+def train_topics(app, store, posts, now):
+    """ Full retrain of the topic model and its dictionary on the given posts.
+
+    :return version: [Str] version of the trained model in the store
+    """
     tokenized_corpus = preprocess(app, posts)
 
     dictionary = get_dictionary(tokenized_corpus)
@@ -111,11 +143,139 @@ def compute_topics(app):
 
     model = train_model(app, bow_corpus, dictionary)
 
-    model.save(os.path.join(module_path, "models", f"LDA_model_{datetime.now().strftime('%Y-%m-%d')}"))
+    coherence = show_model_stats(app, model, bow_corpus, tokenized_corpus, dictionary)
 
-    show_model_stats(app, model, bow_corpus, tokenized_corpus, dictionary)
+    # The drift of later updates is measured against the share of unknown (unigram) tokens of the training corpus
+    return store.save(model, dictionary, dict(trained=now.isoformat(),
+                                              updated=now.isoformat(),
+                                              last_item_id=last_item_id(posts),
+                                              corpus_size=len(bow_corpus),
+                                              coherence=coherence,
+                                              num_topics=NUM_TOPICS,
+                                              backend=TOPIC_MODEL_BACKEND,
+                                              oov_rate=oov_rate(tokenize_and_lemmatize(posts), dictionary),
+                                              **training_window(posts)))
 
-    return model
+
+def update_model(model, bow_corpus, backend, decay=TOPIC_MODEL_DECAY, passes=TOPIC_MODEL_UPDATE_PASSES):
+    """ Online update of a trained LDA model with new documents.
+
+    :param model: [gensim.models.LdaModel] writable, not memory-mapped
+    :param backend: [Str] backend the model was trained with, see train_model
+    :param decay: [float] weight of the previous state, between 0.5 and 1
+    :param passes: [int] passes over the new documents
+    """
+    if backend == 'lda_multicore':
+        # LdaMulticore.update takes neither decay nor passes, it reads them from the model
+        model.decay, model.passes = decay, passes
+        model.update(bow_corpus)
+    else:
+        model.update(bow_corpus, decay=decay, passes=passes)
+
+
+def update_topics(app, store, posts, metadata, now):
+    """ Incremental update of the latest topic model with the posts which arrived since its last training or update.
+
+    The vocabulary of the model is fixed, tokens missing in its dictionary are ignored. If their share drifts too far
+    from the one of the training corpus, no update is done. The coherence in the metadata remains the one of the last
+    full training.
+
+    :return version: [Str] version of the updated model in the store, None if the vocabulary drifted or the latest
+                     version has no dictionary and a full retrain is due
+    """
+    new_posts = [post for post in posts if post.item_id is not None and post.item_id > metadata['last_item_id']]
+
+    dictionary = store.load_dictionary(metadata['version'])
+    if dictionary is None:
+        app.logger.info(f"No dictionary stored with version {metadata['version']}, retraining in full.")
+        return None
+
+    drift = oov_rate(tokenize_and_lemmatize(new_posts), dictionary) - metadata['oov_rate']
+    if drift > TOPIC_MODEL_OOV_DRIFT_THRESHOLD:
+        app.logger.info(f'Vocabulary drift of {drift:.2f} since the last full training, retraining in full.')
+        return None
+
+    if not new_posts:
+        app.logger.info('No new posts since the last update of the LDA model.')
+        save_dictionary(dictionary)
+        return metadata['version']
+
+    # Load a private, writable copy of the arrays instead of the shared read-only memory map
+    model = store.load(metadata['version'], mmap=None)
+
+    app.logger.info(f'Updating LDA model with {len(new_posts)} new posts ...')
+    bow_corpus = get_bow_representation(preprocess(app, new_posts), dictionary)
+
+    update_model(model, bow_corpus, backend=metadata.get('backend', 'lda'))
+    app.logger.info('Finished update.')
+
+    metadata.update(updated=now.isoformat(),
+                    last_item_id=max(metadata['last_item_id'], last_item_id(new_posts)),
+                    corpus_size=metadata['corpus_size'] + len(new_posts),
+                    **training_window(new_posts, metadata))
+    save_dictionary(dictionary)
+
+    return store.save(model, dictionary, metadata)
+
+
+def compute_topics(app, incremental=TOPIC_MODEL_INCREMENTAL):
+    """ Compute the LDA topic model of the posts from the past 24h.
+
+    In incremental mode the latest model is updated with the posts which arrived since its last run, unless its last
+    full training is older than TOPIC_MODEL_RETRAIN_HOURS or the vocabulary of the new posts drifted away from it. A
+    full retrain trains a fresh model and dictionary on all posts from the past 24h.
+
+    Either way the model is stored as a new version in the topic model store and returned memory-mapped from there,
+    see data_structures.TopicModel.
+
+    :param app: [flask.Flask] object which implements a WSGI application
+    :param incremental: [Bool] whether to update the latest model instead of always retraining in full
+    :return: model: [gensim.models.LdaModel] the trained topic model
+    """
+    # Start the run with a clean model registry, the training steps register the artifacts of this run. The
+    # summarization model doesn't depend on the training run and stays warm across runs.
+    invalidate(keep=('summarizer',))
+
+    store = TopicModel()
+
+    now = datetime.utcnow()
+    metadata = store.load_metadata() if incremental else None
+
+    posts = collect_posts(app)
+
+    version = None
+
+    if metadata and metadata['num_topics'] == NUM_TOPICS and \
+            now - datetime.fromisoformat(metadata['trained']) < timedelta(hours=TOPIC_MODEL_RETRAIN_HOURS):
+        version = update_topics(app, store, posts, metadata, now)
+
+    if version is None:
+        version = train_topics(app, store, posts, now)
+
+    return get_topic_model(store, version)
+
+
+def load_latest_topics(app):
+    """ Load the latest stored topic model and its dictionary for ranking, without training.
+
+    :param app: [flask.Flask] object which implements a WSGI application
+    :return: model: [gensim.models.LdaModel] the memory-mapped topic model
+    """
+    invalidate(keep=('summarizer',))
+
+    store = TopicModel()
+    metadata = store.load_metadata()
+    assert metadata is not None, f'No topic model stored in {store.path} yet.'
+
+    app.logger.info(f"Loading topic model version {metadata['version']}, trained on {metadata['corpus_size']} posts "
+                    f"from {metadata['window_start']} to {metadata['window_end']}.")
+
+    # Rank with the vocabulary of the stored model instead of the dictionary of today's run
+    dictionary = store.load_dictionary(metadata['version'])
+    assert dictionary is not None, f"No dictionary stored with topic model version {metadata['version']}."
+    register_model('dictionary', current_version(), dictionary)
+
+    return get_topic_model(store, metadata['version'])
 
 
 if __name__ == '__main__':
@@ -1,4 +1,7 @@
+from flask import current_app
+
 from rssbriefing import db
+from rssbriefing.cache import DEFAULT_TTL, get_cache
 from rssbriefing.models import Briefing
 
 
@@ -37,3 +40,43 @@ def get_standard_briefing():
         return None, None
 
     return items, latest_briefing_date
+
+
+def get_briefing_cache():
+    """ Cache of the public briefing pages. Briefings are written by the briefing generation script, another
+    process, thus there is no invalidation: a new briefing shows up once the cached entries expire. """
+    return get_cache('briefing', ttl=current_app.config.get('BRIEFING_CACHE_TTL', DEFAULT_TTL))
+
+
+def get_cached_latest_briefing_date(user=1):
+    """ get_latest_briefing_date(), cached for BRIEFING_CACHE_TTL seconds.
+
+    :return: [datetime.datetime] None if no briefing is available
+    """
+    return get_briefing_cache().get_or_set(('latest_date', user), lambda: get_latest_briefing_date(user))
+
+
+def to_cached_item(item):
+    """ Detached copy of a Briefing item with the fields shown by the templates. Jinja resolves item.title and
+    item['title'] alike on a dict. """
+    return dict(title=item.title, description=item.description, summary=item.summary, link=item.link,
+                feed_title=item.feed_title, feed=dict(id=item.feed.id, title=item.feed.title, link=item.feed.link))
+
+
+def get_cached_standard_briefing():
+    """ get_standard_briefing() with the items as detached copies, cached per briefing batch, i.e. per latest
+    briefing_created timestamp.
+
+    :return: [tuple(Lst[Dict], Str)] items and formatted date, (None, None) if no briefing is available
+    """
+    latest_briefing_date = get_cached_latest_briefing_date(user=1)
+
+    if latest_briefing_date is None:
+        return None, None
+
+    def load():
+        items, briefing_date = get_standard_briefing()
+
+        return [to_cached_item(item) for item in items or []], briefing_date
+
+    return get_briefing_cache().get_or_set(('standard_briefing', latest_briefing_date), load)
@@ -1,34 +1,19 @@
-from flask import Blueprint, g, render_template, request
+import hashlib
+
+from flask import Blueprint, g, render_template, request, session, make_response
 from flask import current_app as app, flash, redirect, url_for
 
 from rssbriefing import db
 from rssbriefing.auth import login_required
 from rssbriefing.db_utils import get_feedlist_for_dropdown, get_user_by_email
-from rssbriefing.models import Briefing, Users
+from rssbriefing.models import Users
 from rssbriefing.forms import SubscribeForm
-from rssbriefing.briefing_utils import get_standard_briefing
+from rssbriefing.briefing_utils import get_briefing_cache, get_cached_latest_briefing_date, \
+    get_cached_standard_briefing
 
 bp = Blueprint('briefing', __name__)
 
 
-def get_latest_briefing_date(user):
-    datetime_obj = db.session.query(
-        db.func.max(Briefing.briefing_created)). \
-        filter(Briefing.user_id == user). \
-        scalar()
-
-    return datetime_obj
-
-
-def get_briefing_items(user, briefing_date):
-    items = Briefing.query. \
-        filter(Briefing.user_id == user). \
-        filter(Briefing.briefing_created == briefing_date). \
-        all()
-
-    return items
-
-
 def get_feedlist_for_logged_in_user():
     if g.user:
         feedlist = get_feedlist_for_dropdown(g.user.id)
@@ -41,32 +26,22 @@ def get_feedlist_for_logged_in_user():
 @bp.route('/')
 @login_required
 def index():
-    # Get the date of the most recent briefing
-    latest_briefing_date = get_latest_briefing_date(user=1)
-
-    # Get all items of most recent briefing
-    items = get_briefing_items(user=1, briefing_date=latest_briefing_date)
-
-    if all([item.guid for item in items]):
-        items = sorted(items, key=lambda item: int(item.guid), reverse=False)
-
-    # If briefing available: Convert briefing date to custom string format for display
-    if latest_briefing_date:
-        latest_briefing_date = latest_briefing_date.strftime("%B %d, %Y at %I:%M %p")
+    # Items and formatted date of the most recent briefing, cached until a new briefing is saved
+    items, latest_briefing_date = get_cached_standard_briefing()
 
     # Get all feeds of user for the dropdown in the header navbar
     feeds = get_feedlist_for_dropdown(g.user.id)
 
     return render_template('briefing/index.html',
-                           items=items,
+                           items=items or [],
                            feeds=feeds,
                            briefing_date=latest_briefing_date)
 
 
 @bp.route('/start', methods=('GET', 'POST'))
 def landing_page():
-    # Get the date of the most recent briefing
-    latest_briefing_date = get_latest_briefing_date(user=1)
+    # Get the date of the most recent briefing, only the date is cached since the page carries a CSRF token
+    latest_briefing_date = get_cached_latest_briefing_date(user=1)
 
     # Convert briefing date to custom string format for display
     latest_briefing_date = latest_briefing_date.strftime("%B %d, %Y at %I:%M %p") if latest_briefing_date else None
@@ -107,10 +82,8 @@ def landing_page():
                            form=form)
 
 
-@bp.route('/example')
-def example_briefing():
-
-    briefing_items, latest_briefing_date = get_standard_briefing()
+def render_example_briefing():
+    briefing_items, latest_briefing_date = get_cached_standard_briefing()
 
     # For logged in user: Get all feeds of user for the dropdown in the header navbar
     feeds = get_feedlist_for_logged_in_user()
@@ -121,6 +94,35 @@ def example_briefing():
                            briefing_date=latest_briefing_date)
 
 
+def briefing_etag(*key):
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+@bp.route('/example')
+def example_briefing():
+
+    # The navbar of logged in users and pending flash messages make the page personal, render those on each hit
+    if g.user or session.get('_flashes'):
+        return render_example_briefing()
+
+    # Anonymous page: Identical for all visitors until the next briefing, thus cache the rendered html by the date of
+    # the latest briefing and let clients revalidate their copy with the ETag
+    latest_briefing_date = get_cached_latest_briefing_date(user=1)
+    etag = briefing_etag('example', latest_briefing_date)
+
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        html = get_briefing_cache().get_or_set(('example_html', latest_briefing_date), render_example_briefing)
+        response = make_response(html)
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Cookie')
+
+    return response
+
+
 @bp.route('/how_it_works')
 def how_it_works():
     # For logged in user: Get all feeds of user for the dropdown in the header navbar
@@ -0,0 +1,88 @@
+"""
+
+In-process caches of the web app
+
+The caches live in app.extensions, thus each app instance (each gunicorn worker process) has its own. Evicting an entry
+only affects the calling process. Entries expire after a TTL, so that changes made by other processes, e.g. a new
+briefing written by the briefing generation script, show up after at most the TTL.
+
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+DEFAULT_MAXSIZE = 128
+DEFAULT_TTL = 60
+
+
+class TTLCache:
+    """ Thread-safe LRU cache whose entries expire ttl seconds after they were set. """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return default
+
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_set(self, key, compute):
+        """ Get the value of key, computing and caching it on a miss. compute() runs outside of the lock, thus
+        concurrent misses may compute the same value more than once. """
+        missing = object()
+
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.set(key, value)
+
+        return value
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_caches_lock = threading.Lock()
+
+
+def get_cache(name, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL):
+    """ The cache of the current app with the given name, created with maxsize and ttl on first access.
+
+    :param name: [Str] e.g. 'briefing'
+    :return: [TTLCache]
+    """
+    caches = current_app.extensions.setdefault('rssbriefing_caches', {})
+
+    with _caches_lock:
+        if name not in caches:
+            caches[name] = TTLCache(maxsize, ttl)
+
+        return caches[name]
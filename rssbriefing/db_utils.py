@@ -1,5 +1,18 @@
+import uuid
+from collections import namedtuple
+
+from flask import current_app, has_request_context, session
+
+from rssbriefing import db
+from rssbriefing.cache import DEFAULT_TTL, get_cache
 from rssbriefing.models import Users, Feed
 
+# Lightweight, detached copy of a user for g.user, without the feeds and briefing items
+UserRecord = namedtuple('UserRecord', ['id', 'username', 'email'])
+
+# Entry of the feed dropdown in the navbar
+FeedRecord = namedtuple('FeedRecord', ['id', 'title'])
+
 
 def get_user_by_id(user_id):
     return Users.query.get(user_id)
@@ -11,10 +24,38 @@ def get_user_by_username(username):
     return found
 
 
+def get_feedlist_version():
+    """ Version of the logged in user's feed list. It is kept in the session, thus every process serving the user
+    sees the same version. None outside of a request. """
+    return session.get('feedlist_version') if has_request_context() else None
+
+
+def bump_feedlist_version():
+    """ Mark the cached feed list of the logged in user as outdated after a change of the user's feeds, in all
+    processes. Other sessions of the same user pick up the change once their cached feed list expires after
+    FEEDLIST_CACHE_TTL seconds. """
+    # Random instead of counted, thus two sessions of the same user never share a version
+    session['feedlist_version'] = uuid.uuid4().hex
+
+
+def load_feedlist(user_id):
+    rows = db.session.query(Feed.id, Feed.title). \
+        join(Feed.users). \
+        filter(Users.id == user_id). \
+        order_by(Feed.id). \
+        all()
+
+    return [FeedRecord(*row) for row in rows]
+
+
 def get_feedlist_for_dropdown(user_id):
-    feeds = Feed.query.filter(Feed.users.any(Users.id == user_id)).all()
+    """ The feeds of a user, cached per version of the user's feed list, see get_feedlist_version.
 
-    return feeds
+    :return: [Lst[FeedRecord]]
+    """
+    cache = get_cache('feedlist', maxsize=1024, ttl=current_app.config.get('FEEDLIST_CACHE_TTL', DEFAULT_TTL))
+
+    return cache.get_or_set((user_id, get_feedlist_version()), lambda: load_feedlist(user_id))
 
 
 def get_all_users():
@@ -23,3 +64,28 @@ def get_all_users():
 
 def get_user_by_email(email):
     return Users.query.filter_by(email=email).first()
+
+
+def get_user_cache():
+    return get_cache('users', maxsize=1024, ttl=current_app.config.get('USER_CACHE_TTL', DEFAULT_TTL))
+
+
+def load_user_record(user_id):
+    row = db.session.query(Users.id, Users.username, Users.email).filter(Users.id == user_id).first()
+
+    return UserRecord(*row) if row else None
+
+
+def get_user_record(user_id):
+    """ The record of a user, cached for USER_CACHE_TTL seconds per process.
+
+    :return: [UserRecord] None if no user has this id
+    """
+    return get_user_cache().get_or_set(user_id, lambda: load_user_record(user_id))
+
+
+def invalidate_user(user_id):
+    """ Drop the cached record of a user after a change of the user's row, e.g. a password reset. Only the cache of
+    this process is evicted, other processes serve their cached record until it expires after USER_CACHE_TTL
+    seconds. """
+    get_user_cache().pop(user_id)
@@ -11,8 +11,17 @@
     and the EMAIL_USE_TLS and EMAIL_USE_SSL settings control whether a secure connection is used.
 
 """
+import re
+import time
+import uuid
 from datetime import datetime
-from django.core.mail import send_mail, send_mass_mail
+from email.utils import formatdate, make_msgid
+from textwrap import TextWrapper
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection, send_mail, send_mass_mail
+from django.core.mail.message import sanitize_address
+from django.core.mail.utils import DNS_NAME
 from flask import current_app as app
 from flask import render_template
 
@@ -83,6 +92,250 @@ def send_multiple_mails_single_connection(datatuple,
                    connection=connection)
 
 
+def close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+def send_batches(connection, messages, batch_size, rate_limit=None, on_result=None):
+    """
+        Send messages over one SMTP connection, which is reopened for each batch and after a failed message.
+
+    :param connection: [django.core.mail.backends.base.BaseEmailBackend]
+    :param messages: [Lst[django.core.mail.EmailMessage]]
+    :param batch_size: [int] max. number of messages per SMTP session, many servers cap the messages per session
+    :param rate_limit: [float] opt. max. number of messages per second
+    :param on_result: [callable] opt. called with each message and None if it was sent, else the exception
+    :return: [Lst[django.core.mail.EmailMessage]] messages which couldn't be sent
+    """
+    on_result = on_result or (lambda message, error: None)
+    interval = 1 / rate_limit if rate_limit else 0
+    next_send = time.monotonic()
+    failed = []
+
+    for start in range(0, len(messages), batch_size):
+        batch = messages[start:start + batch_size]
+        is_open = False
+
+        for idx, message in enumerate(batch):
+            if not is_open:
+                try:
+                    connection.open()
+                    is_open = True
+                except Exception as err:
+                    app.logger.error('Could not connect to the SMTP server', exc_info=True)
+                    failed.extend(batch[idx:])
+                    for unsent in batch[idx:]:
+                        on_result(unsent, err)
+                    break
+
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            next_send = max(next_send, time.monotonic()) + interval
+
+            try:
+                connection.send_messages([message])
+                on_result(message, None)
+            except Exception as err:
+                app.logger.warning(f'Sending to {message.to} failed', exc_info=True)
+                failed.append(message)
+                on_result(message, err)
+
+                # The session may be broken, e.g. by a dropped connection, start a new one for the next message
+                close_quietly(connection)
+                is_open = False
+
+        if is_open:
+            close_quietly(connection)
+
+        app.logger.info(f'Sent {min(start + batch_size, len(messages))}/{len(messages)} messages, '
+                        f'{len(failed)} failed.')
+
+    return failed
+
+
+def send_bulk_mails(messages,
+                    connection=None,
+                    batch_size=100,
+                    rate_limit=None,
+                    max_retries=2,
+                    retry_delay=5,
+                    on_result=None):
+    """
+        Send many messages over a reused SMTP connection instead of one connection per message, thus the TCP, TLS
+        and auth handshakes are done once per batch. Failed messages are retried after all others were sent.
+
+    :param messages: [Lst[django.core.mail.EmailMessage]] one message per recipient
+    :param connection: The optional email backend to use to send the mail. If unspecified, an instance of the default backend will be used.
+    :param batch_size: [int] max. number of messages per SMTP session
+    :param rate_limit: [float] opt. max. number of messages per second
+    :param max_retries: [int] number of retries of the failed messages
+    :param retry_delay: [float] seconds to wait before each retry
+    :param on_result: [callable] opt. called after each attempt with the message and None if it was sent, else the
+                      exception
+    :return: [Lst[django.core.mail.EmailMessage]] messages which couldn't be sent after all retries
+    """
+    connection = connection or get_connection()
+
+    pending = send_batches(connection, list(messages), batch_size, rate_limit, on_result)
+
+    for retry in range(max_retries):
+        if not pending:
+            break
+
+        app.logger.warning(f'Retrying {len(pending)} failed messages in {retry_delay} seconds...')
+        time.sleep(retry_delay)
+
+        pending = send_batches(connection, pending, batch_size, rate_limit, on_result)
+
+    return pending
+
+
+# Stands in for a per-recipient field while the shared template is rendered and MIME encoded. The random token of
+# each PrerenderedEmail keeps text of the briefing items which looks like a placeholder from being taken for one.
+PLACEHOLDER = '@@{token}:{field}@@'
+
+# Headers which differ per recipient, all others are shared
+RECIPIENT_HEADERS = ('To', 'Date', 'Message-ID')
+
+# Plain ASCII address without display name, which needs no encoding in a header
+PLAIN_ADDRESS_PATTERN = re.compile(r'^[A-Za-z0-9.!#$%&\'*+/=?^_`{|}~-]+@[A-Za-z0-9.-]+$')
+
+
+def fill_placeholders(parts, fields):
+    """ Join the parts of a text split by the placeholder pattern of a PrerenderedEmail, the odd parts are the field
+    names.
+
+    :param parts: [Lst[Str]] or [Lst[bytes]]
+    :param fields: [Dict] values of the fields, of the same type as the parts
+    """
+    return parts[0][:0].join(fields[part] if idx % 2 else part for idx, part in enumerate(parts))
+
+
+class PrerenderedEmail:
+    """
+        Email to many recipients whose template is rendered and MIME encoded only once.
+
+        The per-recipient fields, e.g. a greeting with the name, are rendered as placeholders and filled in for each
+        recipient, directly into the encoded message. Their values should be short single lines, such as a name.
+    """
+
+    def __init__(self, subject, from_email, template, fields=(), **context):
+        """
+        :param subject: [Str]
+        :param from_email: [Str]
+        :param template: [Str] name of the text template
+        :param fields: [Tuple[Str]] names of the per-recipient template variables
+        :param context: the shared template variables
+        """
+        self.subject = subject
+        self.from_email = from_email
+
+        token = uuid.uuid4().hex
+        field_names = '|'.join(re.escape(field) for field in fields)
+        # Only the declared fields of this token are placeholders
+        self.placeholder_pattern = re.compile(re.escape(f'@@{token}:') + f'({field_names})' + re.escape('@@'))
+
+        text = render_template(template, **context,
+                               **{field: PLACEHOLDER.format(token=token, field=field) for field in fields})
+        self.body_parts = self.placeholder_pattern.split(text)
+
+        self.mime_message = EmailMessage(subject, text, from_email, ['recipient@localhost']).message()
+        for header in RECIPIENT_HEADERS:
+            del self.mime_message[header]
+
+        # Filling in encoded bytes is only safe for an 8bit body, long lines are encoded quoted-printable instead
+        self.prerendered = self.mime_message['Content-Transfer-Encoding'] == '8bit'
+        self._flat_parts = {}
+
+    def flat_parts(self, linesep):
+        """ The encoded message without the recipient headers, split by the placeholders. """
+        if linesep not in self._flat_parts:
+            flat = self.mime_message.as_bytes(linesep=linesep)
+            self._flat_parts[linesep] = re.split(self.placeholder_pattern.pattern.encode(), flat)
+
+        return self._flat_parts[linesep]
+
+    def message_for(self, email, **fields):
+        """
+        :param email: [Str] address of the recipient
+        :param fields: [Str] values of the per-recipient fields
+        :return: [django.core.mail.EmailMessage]
+        """
+        body = fill_placeholders(self.body_parts, fields)
+
+        if not self.prerendered:
+            return EmailMessage(self.subject, body, self.from_email, [email])
+
+        return PrerenderedEmailMessage(self, fields, subject=self.subject, body=body, from_email=self.from_email,
+                                       to=[email])
+
+
+class PrerenderedEmailMessage(EmailMessage):
+    """ EmailMessage of a PrerenderedEmail, encoded by filling in the recipient into the shared encoded message. """
+
+    def __init__(self, prerendered_email, fields, **kwargs):
+        super().__init__(**kwargs)
+        self.prerendered_email = prerendered_email
+        self.fields = fields
+
+    def message(self):
+        return PrerenderedMIMEMessage(self)
+
+
+class PrerenderedMIMEMessage:
+    """ Stands in for the MIME message of a PrerenderedEmailMessage towards the email backends, which only call
+    as_bytes(). """
+
+    def __init__(self, email_message):
+        self.email_message = email_message
+
+    def as_bytes(self, unixfrom=False, linesep='\n'):
+        email_message = self.email_message
+        encoding = email_message.encoding or settings.DEFAULT_CHARSET
+
+        to = [address if PLAIN_ADDRESS_PATTERN.match(address) else sanitize_address(address, encoding)
+              for address in email_message.to]
+
+        headers = [f'To: {", ".join(to)}',
+                   f'Date: {formatdate(localtime=settings.EMAIL_USE_LOCALTIME)}',
+                   f'Message-ID: {make_msgid(domain=DNS_NAME)}',
+                   '']
+        fields = {field.encode(): value.encode('utf-8') for field, value in email_message.fields.items()}
+
+        return linesep.join(headers).encode() + \
+            fill_placeholders(email_message.prerendered_email.flat_parts(linesep), fields)
+
+
+def wrap_briefing_items(items):
+    """ Copies of the briefing items with the title and summary wrapped into paragraphs of max width 70 chars, the
+    items themselves are left unchanged.
+
+    :param items: [Lst[rssbriefing.models.Briefing]]
+    :return: [Lst[Dict]]
+    """
+    wrapper = TextWrapper()
+
+    return [dict(title=wrapper.fill(item.title), summary=wrapper.fill(item.summary or ''),
+                 feed_title=item.feed_title, link=item.link)
+            for item in items]
+
+
+def get_briefing_email(items, briefing_date, weekday_str):
+    """ The briefing email of a run, rendered once for all recipients.
+
+    :return: [PrerenderedEmail] call .message_for(user.email) per recipient
+    """
+    return PrerenderedEmail(subject=f"Your {weekday_str} RoboBriefing",
+                            from_email=app.config['ADMINS'][0],
+                            template='briefing/briefing_email.txt',
+                            items=wrap_briefing_items(items),
+                            briefing_date=briefing_date)
+
+
 def send_password_reset_email(user):
     token = user.get_reset_password_token()
     send_single_mail(subject="[RoboBriefing] Reset Your Password",
@@ -105,4 +358,5 @@ def send_standard_briefing(user):
                          from_email=app.config['ADMINS'][0],
                          recipient_list=[user.email],
                          text_body=render_template('briefing/briefing_email.txt',
-                                                   user=user, items=briefing_items, briefing_date=latest_briefing_date))
+                                                   items=wrap_briefing_items(briefing_items),
+                                                   briefing_date=latest_briefing_date))
@@ -0,0 +1,136 @@
+"""
+
+Resumable dispatch of the briefing emails over concurrent SMTP connections, with a delivery log per recipient
+
+Each recipient of a briefing gets an entry in the delivery_log table, which records whether the email was sent and how
+often it was tried. A rerun for the same briefing skips the recipients it was already sent to, thus a run which
+aborted, e.g. because the SMTP server went away, is resumed instead of repeated. Delivery is at least once: an email
+which was sent right before a crash, but not yet logged, is sent again.
+
+"""
+import queue
+import threading
+from datetime import datetime
+
+from django.core.mail import get_connection
+
+from rssbriefing import db
+from rssbriefing.email import send_bulk_mails
+from rssbriefing.models import DeliveryLog
+
+PENDING = 'pending'
+SENT = 'sent'
+FAILED = 'failed'
+
+
+def get_delivery_logs(user_ids, briefing_created):
+    """ Delivery log entries of a briefing for the given users, created as pending where missing.
+
+    :param user_ids: [Lst[int]]
+    :param briefing_created: [datetime.datetime] identifies the briefing
+    :return: [Dict[int, rssbriefing.models.DeliveryLog]] by user id
+    """
+    logs = {log.user_id: log for log in DeliveryLog.query.filter_by(briefing_created=briefing_created)}
+
+    for user_id in user_ids:
+        if user_id not in logs:
+            logs[user_id] = DeliveryLog(user_id=user_id, briefing_created=briefing_created, status=PENDING,
+                                        attempts=0)
+            db.session.add(logs[user_id])
+
+    db.session.commit()
+
+    return logs
+
+
+def record_result(log, error):
+    log.attempts += 1
+    log.status, log.error = (SENT, None) if error is None else (FAILED, str(error))
+    log.updated = datetime.utcnow()
+
+
+def dispatch_emails(app,
+                    recipients,
+                    briefing_created,
+                    workers=1,
+                    batch_size=100,
+                    rate_limit=None,
+                    max_retries=2,
+                    retry_delay=5,
+                    commit_interval=100,
+                    connection_factory=None):
+    """ Send the emails of a briefing which weren't sent yet, through a pool of concurrent SMTP connections.
+
+    The worker threads only talk to the SMTP server, each over its own connection, see rssbriefing.email
+    .send_bulk_mails. The calling thread records their results in the delivery log and commits them as they come in.
+
+    :param app: [flask.Flask] The flask object implements a WSGI application
+    :param recipients: [Lst[Tuple[int, django.core.mail.EmailMessage]]] user id and email per recipient
+    :param briefing_created: [datetime.datetime] identifies the briefing
+    :param workers: [int] number of concurrent SMTP connections
+    :param rate_limit: [float] opt. max. number of messages per second over all connections
+    :param commit_interval: [int] max. number of results recorded per commit
+    :param connection_factory: [callable] opt. returns a new email backend, defaults to the backend of the Django
+                               settings
+    :return: [Dict[Str, int]] number of recipients per outcome: 'sent', 'failed' and 'skipped' (sent by a previous run)
+    """
+    connection_factory = connection_factory or get_connection
+
+    logs = get_delivery_logs([user_id for user_id, _ in recipients], briefing_created)
+
+    pending = [(user_id, message) for user_id, message in recipients if logs[user_id].status != SENT]
+    user_ids = {id(message): user_id for user_id, message in pending}
+
+    workers = max(1, min(workers, len(pending)))
+    results = queue.Queue()
+
+    def send(messages):
+        try:
+            with app.app_context():
+                send_bulk_mails(messages,
+                                connection=connection_factory(),
+                                batch_size=batch_size,
+                                rate_limit=rate_limit / workers if rate_limit else None,
+                                max_retries=max_retries,
+                                retry_delay=retry_delay,
+                                on_result=lambda message, error: results.put((message, error)))
+        except Exception:
+            # Unsent emails stay pending and are sent by the next run
+            app.logger.error('Email dispatch worker failed', exc_info=True)
+        finally:
+            results.put(None)
+
+    threads = [threading.Thread(target=send, args=([message for _, message in pending[idx::workers]],), daemon=True)
+               for idx in range(workers) if pending]
+    for thread in threads:
+        thread.start()
+
+    running = len(threads)
+    uncommitted = 0
+
+    while running:
+        result = results.get()
+
+        if result is None:
+            running -= 1
+            continue
+
+        message, error = result
+        record_result(logs[user_ids[id(message)]], error)
+        uncommitted += 1
+
+        # Commit as soon as the workers are waiting on the SMTP server, thus a crash loses few results
+        if uncommitted >= commit_interval or results.empty():
+            db.session.commit()
+            uncommitted = 0
+
+    db.session.commit()
+
+    for thread in threads:
+        thread.join()
+
+    statuses = [logs[user_id].status for user_id, _ in pending]
+
+    return {'sent': statuses.count(SENT),
+            'failed': len(statuses) - statuses.count(SENT),
+            'skipped': len(recipients) - len(pending)}
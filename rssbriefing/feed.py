@@ -1,9 +1,19 @@
 import calendar
+import hashlib
+import re
 import socket
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime
+from itertools import chain, zip_longest
+from urllib.parse import urlsplit
 
 import feedparser
 import html2text
+from html2text.utils import escape_md_section
+from sqlalchemy.dialects import postgresql
 
 from rssbriefing import db
 from rssbriefing.models import Item, Feed
@@ -11,12 +21,173 @@ from rssbriefing.models import Item, Feed
 # Set timeout in seconds for new socket objects, needed for feedparser connections
 socket.setdefaulttimeout(10)
 
+# Strings without tags or character references are plain text for html2text
+MARKUP_REGEX = re.compile(r'[<&]')
+WHITESPACE_REGEX = re.compile(r'\s+')
 
-def parse_feed(href):
-    feed_dict = feedparser.parse(href)
+# Items per insert statement of update_feed_db, 6 columns each stay below the 999 parameters of older SQLite versions
+INSERT_CHUNK_SIZE = 150
+
+
+class HTMLToText:
+    """ HTML to text converter for feed entries, configured once with html2text options.
+
+    Plain text, which is the norm for titles, takes a fast path which yields the same output as html2text:
+    markdown escaping, collapsed whitespace and a trailing newline. Strings with markup get a fresh HTML2Text
+    parser each, since a reused parser carries state of unclosed tags (e.g. <pre>, <blockquote>) into the next call.
+    """
+
+    def __init__(self, **options):
+        self.options = options
+
+    def handle(self, text):
+        if not MARKUP_REGEX.search(text):
+            return WHITESPACE_REGEX.sub(' ', escape_md_section(text)).lstrip() + '\n'
+
+        text_maker = html2text.HTML2Text()
+        for option, value in self.options.items():
+            setattr(text_maker, option, value)
+
+        return text_maker.handle(text)
+
+
+# Remove html2text default newline wrapping with body_width=0
+html_to_text = HTMLToText(ignore_links=True, ignore_images=True, body_width=0)
+
+
+class TimeoutHTTPHandler(urllib.request.HTTPHandler):
+    """ urllib handler which applies a per-request socket timeout instead of the global default. """
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def http_open(self, req):
+        req.timeout = self.timeout
+        return super().http_open(req)
+
+
+class TimeoutHTTPSHandler(urllib.request.HTTPSHandler):
+    """ urllib handler which applies a per-request socket timeout instead of the global default. """
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def https_open(self, req):
+        req.timeout = self.timeout
+        return super().https_open(req)
+
+
+class HostLimiter:
+    """ Limit the number of concurrent connections to the same host across threads. """
+
+    def __init__(self, per_host):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    @contextmanager
+    def limit(self, href):
+        host = urlsplit(href).hostname
+
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.BoundedSemaphore(self.per_host))
+
+        with semaphore:
+            yield
+
+
+def parse_feed(href, timeout=None, etag=None, modified=None):
+    """ Download and parse a feed.
+
+    If the validators of a previous response are supplied, feedparser sends a conditional GET and the server may
+    answer with 304 Not Modified and no body, see not_modified().
+
+    :param href: [Str] URL of the RSS/Atom feed
+    :param timeout: [float] opt. socket timeout in seconds for this feed, defaults to the global socket timeout
+    :param etag: [Str] opt. ETag header of the previous response
+    :param modified: [Str] opt. Last-Modified header of the previous response
+    :return feed_dict: [feedparser.FeedParserDict]
+    """
+    handlers = [TimeoutHTTPHandler(timeout), TimeoutHTTPSHandler(timeout)] if timeout else None
+
+    feed_dict = feedparser.parse(href, etag=etag, modified=modified, handlers=handlers)
     return feed_dict
 
 
+def not_modified(feed_dict):
+    """ True if the server answered a conditional GET with 304 Not Modified, i.e. there is nothing to parse. """
+    return feed_dict.get('status') == 304
+
+
+def update_feed_validators(feed, feed_dict):
+    """ Store the HTTP status and validators (ETag, Last-Modified) of the latest response for the next conditional GET.
+
+    A 304 response may omit the validators, in which case the stored ones stay valid. Changes are not committed.
+
+    :param feed: [rssbriefing.models.Feed]
+    :param feed_dict: [feedparser.FeedParserDict]
+    """
+    # Without a status no response was received (e.g. network error), keep the validators of the last response
+    if 'status' not in feed_dict:
+        feed.last_status = None
+        return
+
+    feed.last_status = feed_dict.status
+
+    if not_modified(feed_dict):
+        feed.etag = feed_dict.get('etag', feed.etag)
+        feed.modified = feed_dict.get('modified', feed.modified)
+    else:
+        feed.etag = feed_dict.get('etag')
+        feed.modified = feed_dict.get('modified')
+
+
+def interleave_by_host(feed_hrefs):
+    """ Order (feed_id, href) tuples round-robin by host, so that feeds of the same host are spread across the run
+    instead of queueing up behind a per-host limit.
+    """
+    by_host = {}
+    for feed_id, href in feed_hrefs:
+        by_host.setdefault(urlsplit(href).hostname, []).append((feed_id, href))
+
+    return [pair for pair in chain.from_iterable(zip_longest(*by_host.values())) if pair is not None]
+
+
+def fetch_feeds(feed_hrefs, workers=8, per_host=2, timeout=10, validators=None):
+    """ Download and parse feeds concurrently with a bounded pool of worker threads.
+
+    Only the network fetch and parsing run in the worker threads, the parsed feeds are yielded back to the calling
+    thread in order of completion, so that db writes stay serialized in its session.
+
+    :param feed_hrefs: [Lst[tuple(int, Str)]] (feed_id, href) of the feeds to fetch
+    :param workers: [int] max number of concurrent fetches
+    :param per_host: [int] max number of concurrent fetches against the same host
+    :param timeout: [float] socket timeout in seconds per feed
+    :param validators: [Dict[int, tuple(Str, Str)]] opt. (etag, modified) per feed_id for conditional GETs
+    :return: generator of (feed_id, feedparser.FeedParserDict) tuples
+    """
+    limiter = HostLimiter(per_host)
+    validators = validators or {}
+
+    def fetch(feed_id, href):
+        etag, modified = validators.get(feed_id, (None, None))
+
+        with limiter.limit(href):
+            try:
+                return parse_feed(href, timeout=timeout, etag=etag, modified=modified)
+            except Exception as err:
+                # Treat unexpected errors like feedparser treats network errors: a bozo feed without entries
+                return feedparser.FeedParserDict(bozo=1, bozo_exception=err, entries=[], feed={})
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(fetch, feed_id, href): feed_id for feed_id, href in interleave_by_host(feed_hrefs)}
+
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
 def well_formed(feed_dict):
     """
     consider a feed malformed if:
@@ -31,11 +202,13 @@ def well_formed(feed_dict):
     return result
 
 
-def get_latest_feed_dict(feed_id):
+def get_latest_feed_dict(feed_id, timeout=None):
     feed = Feed.query.filter_by(id=feed_id).first()
-    feed_href = feed.href
 
-    return parse_feed(feed_href)
+    feed_dict = parse_feed(feed.href, timeout=timeout, etag=feed.etag, modified=feed.modified)
+    update_feed_validators(feed, feed_dict)
+
+    return feed_dict
 
 
 def datetime_from_time_struct(time_struct_time):
@@ -57,12 +230,7 @@ def parse_entry_attribute(entry, attribute):
 
         elif attribute in ('description', 'title'):  # HTML parsing of title and description
 
-            text_maker = html2text.HTML2Text()
-            text_maker.ignore_links = True
-            text_maker.ignore_images = True
-            text_maker.body_width = 0   # Remove html2text default newline wrapping
-
-            value = text_maker.handle(entry[attribute])
+            value = html_to_text.handle(entry[attribute])
 
         else:
 
@@ -81,22 +249,102 @@ def parse_entry_attribute(entry, attribute):
     return value
 
 
+def entry_key(entry):
+    """ Stable deduplication key of a feed entry: its guid/id if the feed supplies one, else a content hash.
+
+    :param entry: [feedparser.FeedParserDict]
+    :return: [Str]
+    """
+    if entry.get('id'):
+        return entry['id']
+
+    content = '\x1f'.join(entry.get(attribute) or '' for attribute in ('title', 'link', 'description'))
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def insert_ignoring_duplicates(table, rows):
+    """ Single multi-row insert statement, which skips rows violating the unique index on (feed_id, guid) instead of
+    failing. """
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql.insert(table).values(rows).on_conflict_do_nothing(index_elements=['feed_id', 'guid'])
+
+    return table.insert().values(rows).prefix_with('OR IGNORE', dialect='sqlite')
+
+
+def adopt_legacy_items(feed_id, rows):
+    """ Match the entries of a feed against its items stored before entry keys were introduced, which have no guid
+    and thus never collide in the unique index. Matching is by link: the legacy item takes the key of the entry, and
+    the entry is dropped from the rows to insert. Only legacy items whose link is still in the feed are looked up.
+
+    :param feed_id: [int]
+    :param rows: [Dict[Str, Dict]] rows to insert by guid, matched entries are removed
+    """
+    links = list({row['link'] for row in rows.values()})
+    if not links:
+        return
+
+    legacy_items = db.session.query(Item.id, Item.link). \
+        filter(Item.feed_id == feed_id, Item.guid.is_(None), Item.link.in_(links)). \
+        all()
+
+    if not legacy_items:
+        return
+
+    legacy_links = {link for _, link in legacy_items}
+    guids_by_link = {}
+    for guid, row in list(rows.items()):
+        if row['link'] in legacy_links:
+            guids_by_link.setdefault(row['link'], guid)
+            del rows[guid]
+
+    # Keys already stored, e.g. by an update before this matching existed, can't be taken by a legacy item
+    taken = {guid for guid, in db.session.query(Item.guid).
+             filter(Item.feed_id == feed_id, Item.guid.in_(list(guids_by_link.values())))}
+
+    for item_id, link in legacy_items:
+        guid = guids_by_link.get(link)
+
+        if guid is not None and guid not in taken:
+            Item.query.filter_by(id=item_id).update({'guid': guid}, synchronize_session=False)
+            taken.add(guid)
+
+
 def update_feed_db(feed_id, feed_dict):
-    # Get latest feed items
-    entries = feed_dict.entries
+    """ Insert the entries of a parsed feed which are not yet in the db, deduplicated by entry_key().
 
-    # Insert new entries to db
-    for entry in entries:
+    All entries go into one multi-row insert per INSERT_CHUNK_SIZE entries, the unique index on (feed_id, guid) lets
+    the db skip the known ones. Commits the session, thus also pending changes of the caller.
 
-        title = parse_entry_attribute(entry, 'title')
-        description = parse_entry_attribute(entry, 'description')
-        link = parse_entry_attribute(entry, 'link')
-        created = parse_entry_attribute(entry, 'published_parsed')
+    :param feed_id: [int]
+    :param feed_dict: [feedparser.FeedParserDict]
+    :return: [int] number of inserted entries
+    """
+    # Get latest feed items, keyed by guid to drop entries repeated within the same feed
+    rows = {}
+    for entry in feed_dict.entries:
 
-        found = Item.query.filter_by(feed_id=feed_id, title=title, description=description, link=link).first()
+        guid = entry_key(entry)
+        if guid in rows:
+            continue
 
-        if not found:
-            new_item = Item(title=title, description=description, link=link, created=created, feed_id=feed_id)
-            db.session.add(new_item)
+        rows[guid] = dict(title=parse_entry_attribute(entry, 'title'),
+                          description=parse_entry_attribute(entry, 'description'),
+                          link=parse_entry_attribute(entry, 'link'),
+                          created=parse_entry_attribute(entry, 'published_parsed'),
+                          guid=guid,
+                          feed_id=feed_id)
+
+    adopt_legacy_items(feed_id, rows)
+
+    rows = list(rows.values())
+
+    # One statement per chunk instead of an executemany, which psycopg2 runs as one round trip per row. The chunks
+    # keep the number of bound parameters below the limit of older SQLite versions.
+    inserted = 0
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        result = db.session.execute(insert_ignoring_duplicates(Item.__table__, rows[start:start + INSERT_CHUNK_SIZE]))
+        inserted += result.rowcount
 
     db.session.commit()
+
+    return inserted
@@ -0,0 +1,69 @@
+"""
+
+    Module with the adaptive polling schedule of feeds.
+
+    Each feed is polled about as often as it publishes, learnt from the Item.created history of the feed, within
+    the bounds of FEED_POLL_MIN_INTERVAL and FEED_POLL_MAX_INTERVAL (minutes) of the app config. Feeds which keep
+    failing or returning nothing new back off exponentially by FEED_POLL_BACKOFF_FACTOR per unproductive poll.
+
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app as app
+
+from rssbriefing import db
+from rssbriefing.models import Feed, Item
+
+
+def get_due_feeds(now=None):
+    """ Feeds which were never polled or whose next poll is due.
+
+    :param now: [datetime.datetime] opt. naive UTC datetime, defaults to datetime.utcnow()
+    :return: [Lst[rssbriefing.models.Feed]]
+    """
+    now = now or datetime.utcnow()
+
+    return Feed.query.filter(db.or_(Feed.next_update.is_(None), Feed.next_update <= now)).all()
+
+
+def get_publishing_intervals(now=None):
+    """ Average time between two items per feed over the last FEED_POLL_HISTORY_DAYS, with one grouped query.
+
+    :param now: [datetime.datetime] opt. naive UTC datetime, defaults to datetime.utcnow()
+    :return: [Dict[int, datetime.timedelta]] feeds without items in the history window are missing
+    """
+    now = now or datetime.utcnow()
+    window = timedelta(days=app.config['FEED_POLL_HISTORY_DAYS'])
+
+    counts = db.session.query(Item.feed_id, db.func.count(Item.id)). \
+        filter(Item.created > now - window). \
+        group_by(Item.feed_id). \
+        all()
+
+    return {feed_id: window / count for feed_id, count in counts}
+
+
+def schedule_next_poll(feed, new_items, publishing_interval=None, now=None):
+    """ Set the next poll of a feed from its publishing interval, backing off after unproductive polls.
+
+    A poll is unproductive if it failed, returned 304 Not Modified or yielded no new items. Changes are not committed.
+
+    :param feed: [rssbriefing.models.Feed]
+    :param new_items: [int] number of new items of this poll
+    :param publishing_interval: [datetime.timedelta] opt. see get_publishing_intervals(), None for unknown
+    :param now: [datetime.datetime] opt. naive UTC datetime, defaults to datetime.utcnow()
+    """
+    now = now or datetime.utcnow()
+    min_interval = timedelta(minutes=app.config['FEED_POLL_MIN_INTERVAL'])
+    max_interval = timedelta(minutes=app.config['FEED_POLL_MAX_INTERVAL'])
+
+    feed.empty_polls = 0 if new_items else (feed.empty_polls or 0) + 1
+
+    # Back off per unproductive poll, until the max interval is reached
+    interval = publishing_interval or max_interval
+    for _ in range(feed.empty_polls):
+        if interval >= max_interval:
+            break
+        interval *= app.config['FEED_POLL_BACKOFF_FACTOR']
+
+    feed.next_update = now + min(max(interval, min_interval), max_interval)
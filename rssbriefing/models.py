@@ -16,7 +16,8 @@ class Users(db.Model):
     username = db.Column(db.String(64), index=True, unique=True)
     email = db.Column(db.String(120), index=True, unique=True)
     password_hash = db.Column(db.String(128))
-    feeds = db.relationship('Feed', secondary=user_feed, lazy='subquery', backref=db.backref('users', lazy=True))
+    # Loaded on access only, most lookups of a user don't need the feeds
+    feeds = db.relationship('Feed', secondary=user_feed, lazy='select', backref=db.backref('users', lazy=True))
     briefing_items = db.relationship('Briefing', lazy=True, backref=db.backref('user', lazy='joined'))
 
     def __repr__(self):
@@ -46,6 +47,13 @@ class Feed(db.Model):
     description = db.Column(db.String())
     link = db.Column(db.String())
     href = db.Column(db.String())
+    # HTTP validators of the latest response, sent back for conditional GETs
+    etag = db.Column(db.String())
+    modified = db.Column(db.String())
+    last_status = db.Column(db.Integer)
+    # Adaptive polling schedule, see rssbriefing.feed_scheduler
+    next_update = db.Column(db.DateTime, index=True)
+    empty_polls = db.Column(db.Integer, default=0)
     items = db.relationship('Item', lazy=True, backref=db.backref('feed', lazy='joined'))
     briefing_items = db.relationship('Briefing', lazy=True, backref=db.backref('feed', lazy='joined'))
 
@@ -59,9 +67,12 @@ class Item(db.Model):
     description = db.Column(db.String())
     link = db.Column(db.String(), nullable=False)
     created = db.Column(db.DateTime, index=True, default=datetime.utcnow)
+    # Deduplication key of the feed entry, see rssbriefing.feed.entry_key
     guid = db.Column(db.String())
     feed_id = db.Column(db.Integer, db.ForeignKey('feed.id'), nullable=False)
 
+    __table_args__ = (db.Index('ix_item_feed_id_guid', 'feed_id', 'guid', unique=True),)
+
     def __repr__(self):
         return '<Feed {}, Item {}>'.format(self.feed_id, self.title)
 
@@ -83,3 +94,59 @@ class Briefing(db.Model):
 
     def __repr__(self):
         return '<Briefing item title {}, feed title {}, user {}>'.format(self.title, self.feed_title, self.user_id)
+
+
+class SummaryCache(db.Model):
+    # Normalized article url, see rssbriefing.briefing_model.summary_cache.normalize_url
+    url = db.Column(db.String(), primary_key=True)
+    # Hash of the preprocessed article text and version of the summarization model and its config
+    text_hash = db.Column(db.String(40), nullable=False)
+    model_version = db.Column(db.String(), nullable=False)
+    # None if the article couldn't be summarized, e.g. as it exceeds the length bounds of the model
+    summary = db.Column(db.String())
+    # Time of the latest download of the article, for the TTL
+    checked = db.Column(db.DateTime, default=datetime.utcnow)
+    # Time of the latest lookup, for the LRU eviction
+    last_used = db.Column(db.DateTime, index=True, default=datetime.utcnow)
+
+    def __repr__(self):
+        return '<Summary cache entry {}>'.format(self.url)
+
+
+# Feed refresh or feed subscription queued by the web app and processed by rssbriefing.scripts.refresh_worker
+class RefreshJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    # 'refresh' of feed_id or 'add_feed' of href for user_id, see rssbriefing.refresh_jobs
+    kind = db.Column(db.String(16), nullable=False)
+    feed_id = db.Column(db.Integer, db.ForeignKey('feed.id'))
+    href = db.Column(db.String())
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # 'pending', 'running', 'done' or 'failed'
+    status = db.Column(db.String(16), index=True, nullable=False, default='pending')
+    error = db.Column(db.String())
+    # Whether the outcome was shown to the user
+    notified = db.Column(db.Boolean, nullable=False, default=False)
+    created = db.Column(db.DateTime, default=datetime.utcnow)
+    started = db.Column(db.DateTime)
+    finished = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return '<Refresh job {} {}, status {}>'.format(self.id, self.kind, self.status)
+
+
+class DeliveryLog(db.Model):
+    __table_args__ = (db.UniqueConstraint('user_id', 'briefing_created'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # The briefing sent, identified by the briefing_created timestamp of its items
+    briefing_created = db.Column(db.DateTime, nullable=False)
+    # 'pending', 'sent' or 'failed', see rssbriefing.email_dispatch
+    status = db.Column(db.String(16), index=True, nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String())
+    updated = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return '<Delivery of briefing {} to user {}, status {}>'.format(self.briefing_created, self.user_id,
+                                                                        self.status)
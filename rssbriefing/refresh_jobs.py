@@ -0,0 +1,214 @@
+"""
+
+Local job queue for feed refreshes and subscriptions, backed by the refresh_job table
+
+The views only enqueue jobs and return immediately, a separate worker process (rssbriefing.scripts.refresh_worker)
+fetches and parses the remote feeds. Several workers may run at once, each job is claimed by exactly one of them.
+
+"""
+from datetime import datetime, timedelta
+
+from rssbriefing import db
+from rssbriefing.db_utils import get_user_by_id
+from rssbriefing.feed import parse_feed, update_feed_db, well_formed, get_latest_feed_dict, not_modified
+from rssbriefing.models import Feed, RefreshJob
+
+REFRESH = 'refresh'
+ADD_FEED = 'add_feed'
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobError(Exception):
+    """ Expected failure of a job, its message is shown to the user. """
+
+
+def enqueue_refresh(feed_id, user_id):
+    """ Queue a refresh of a feed, unless one is already pending.
+
+    :return: [rssbriefing.models.RefreshJob]
+    """
+    job = RefreshJob.query.filter_by(kind=REFRESH, feed_id=feed_id, status=PENDING).first()
+
+    if job is None:
+        job = RefreshJob(kind=REFRESH, feed_id=feed_id, user_id=user_id, status=PENDING)
+        db.session.add(job)
+        db.session.commit()
+
+    return job
+
+
+def enqueue_add_feed(href, user_id):
+    """ Queue the subscription of a user to the feed at href.
+
+    :return: [rssbriefing.models.RefreshJob]
+    """
+    job = RefreshJob(kind=ADD_FEED, href=href, user_id=user_id, status=PENDING)
+    db.session.add(job)
+    db.session.commit()
+
+    return job
+
+
+def is_refresh_pending(feed_id):
+    return db.session.query(RefreshJob.query.filter(RefreshJob.feed_id == feed_id,
+                                                    RefreshJob.status.in_((PENDING, RUNNING))).exists()).scalar()
+
+
+def pop_finished_jobs(user_id):
+    """ Jobs of a user whose outcome wasn't shown to the user yet, marked as shown: failed jobs and successful
+    subscriptions, which change the user's feed list.
+
+    :return: [Lst[rssbriefing.models.RefreshJob]]
+    """
+    jobs = RefreshJob.query.filter(RefreshJob.user_id == user_id,
+                                   RefreshJob.notified.is_(False),
+                                   db.or_(RefreshJob.status == FAILED,
+                                          db.and_(RefreshJob.status == DONE, RefreshJob.kind == ADD_FEED))). \
+        order_by(RefreshJob.id).all()
+
+    for job in jobs:
+        job.notified = True
+    db.session.commit()
+
+    return jobs
+
+
+def claim_next_job():
+    """ Claim the oldest pending job for this worker.
+
+    The claim is a conditional update from 'pending' to 'running', thus concurrent workers never claim the same job.
+
+    :return: [rssbriefing.models.RefreshJob] None if no job is pending
+    """
+    while True:
+        job_id = db.session.query(RefreshJob.id).filter_by(status=PENDING).order_by(RefreshJob.id).limit(1).scalar()
+
+        if job_id is None:
+            return None
+
+        claimed = RefreshJob.query.filter_by(id=job_id, status=PENDING). \
+            update({'status': RUNNING, 'started': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+
+        if claimed:
+            return RefreshJob.query.get(job_id)
+
+
+def requeue_stale_jobs(timeout):
+    """ Put jobs back into the queue whose worker died while running them.
+
+    :param timeout: [float] seconds after which a running job counts as stale
+    :return: [int] number of requeued jobs
+    """
+    requeued = RefreshJob.query.filter(RefreshJob.status == RUNNING,
+                                       RefreshJob.started < datetime.utcnow() - timedelta(seconds=timeout)). \
+        update({'status': PENDING, 'started': None}, synchronize_session=False)
+    db.session.commit()
+
+    return requeued
+
+
+def refresh_feed(feed_id, timeout=None):
+    feed_dict = get_latest_feed_dict(feed_id, timeout=timeout)
+
+    # Nothing to parse if the feed didn't change since the last poll, only store the validators
+    if not_modified(feed_dict):
+        db.session.commit()
+    else:
+        update_feed_db(feed_id, feed_dict)
+
+
+def add_feed(href, user_id, timeout=None):
+    """ Subscribe a user to the feed at href, adding the feed and its entries to the db if it is new.
+
+    :raise JobError: if the feed is not well-formed or the user already subscribed to it
+    """
+    parsed_feed = parse_feed(href, timeout=timeout)
+
+    if not well_formed(parsed_feed):
+        raise JobError('Feed is not well-formed!')
+
+    title = parsed_feed.feed.get('title', 'No title')
+    # TODO add html parsing to extract text and img link in description:
+    description = parsed_feed.feed.get('description', 'No description')
+    link = parsed_feed.feed.get('link', 'No link')
+
+    # Check whether feed already exists in database
+    found_feed = Feed.query.filter_by(title=title).first()
+
+    # Check whether relation to given user exists
+    current_user = get_user_by_id(user_id)
+
+    if found_feed:
+
+        if current_user.id in [user.id for user in found_feed.users]:
+            raise JobError('Feed was already added!')
+
+        # If feed exists but no relation to user exists yet, create one
+        current_user.feeds.append(found_feed)
+        db.session.commit()
+
+    # If feed doesn't exist at all in database, add it and create relation to given user
+    else:
+
+        feed_entry = Feed(title=title, description=description, link=link, href=href,
+                          etag=parsed_feed.get('etag'), modified=parsed_feed.get('modified'),
+                          last_status=parsed_feed.get('status'))
+        current_user.feeds.append(feed_entry)
+        # After flushing, the model will have the id property set
+        db.session.flush()
+
+        # Commits the subscription together with the entries of the feed, a failed load leaves no feed without items
+        update_feed_db(feed_entry.id, parsed_feed)
+
+
+def process_job(app, job, timeout=None):
+    """ Run a claimed job and record its outcome.
+
+    :param app: [flask.Flask] The flask object implements a WSGI application
+    :param job: [rssbriefing.models.RefreshJob]
+    :param timeout: [float] opt. socket timeout in seconds for the feed download
+    """
+    job_id = job.id
+
+    try:
+        if job.kind == REFRESH:
+            refresh_feed(job.feed_id, timeout=timeout)
+        else:
+            add_feed(job.href, job.user_id, timeout=timeout)
+
+        status, error = DONE, None
+
+    except JobError as err:
+        db.session.rollback()
+        status, error = FAILED, str(err)
+
+    except Exception as err:
+        app.logger.error(f'Refresh job {job_id} failed', exc_info=True)
+        db.session.rollback()
+        status, error = FAILED, f'Feed could not be loaded: {err}'
+
+    job = RefreshJob.query.get(job_id)
+    job.status, job.error, job.finished = status, error, datetime.utcnow()
+    db.session.commit()
+
+
+def process_pending_jobs(app, timeout=None):
+    """ Process jobs until the queue is empty.
+
+    :return: [int] number of processed jobs
+    """
+    processed = 0
+
+    job = claim_next_job()
+    while job is not None:
+        process_job(app, job, timeout=timeout)
+        processed += 1
+
+        job = claim_next_job()
+
+    return processed
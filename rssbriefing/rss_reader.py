@@ -2,17 +2,32 @@ from flask import Blueprint, flash, g, redirect, render_template, request, url_f
 
 from rssbriefing import db
 from rssbriefing.auth import login_required
-from rssbriefing.db_utils import get_user_by_id, get_feedlist_for_dropdown
-from rssbriefing.feed import parse_feed, update_feed_db, well_formed, get_latest_feed_dict
+from rssbriefing.db_utils import get_user_by_id, get_feedlist_for_dropdown, bump_feedlist_version
 from rssbriefing.models import Feed, Users, Item
+from rssbriefing.refresh_jobs import DONE, enqueue_refresh, enqueue_add_feed, is_refresh_pending, pop_finished_jobs
 
 bp = Blueprint('rss_reader', __name__)
 
+PENDING_MESSAGE = 'Loading the feed in the background, its latest posts will show up in a moment.'
+
+
+def handle_finished_jobs(user_id):
+    """ Act on the user's feed jobs which finished in the background since the last page view: flash the errors of
+    failed jobs and bump the version of the cached feed list after successful subscriptions. """
+    for job in pop_finished_jobs(user_id):
+        if job.status == DONE:
+            # Subscribed by the refresh worker, which has no access to the session: Reload the feed list of the navbar
+            bump_feedlist_version()
+        else:
+            flash(job.error)
+
 
 @bp.route('/latest')
 @login_required
 def latest():
 
+    handle_finished_jobs(g.user.id)
+
     items = Item.query. \
         join(Feed). \
         join(Feed.users). \
@@ -31,9 +46,14 @@ def single(feed_id):
 
     refresh = request.args.get('refresh', None)
 
+    # The refresh worker fetches the feed, reload the page without the refresh argument meanwhile
     if refresh:
-        feed_dict = get_latest_feed_dict(feed_id)
-        update_feed_db(feed_id, feed_dict)
+        enqueue_refresh(feed_id, g.user.id)
+        flash(PENDING_MESSAGE)
+
+        return redirect(url_for('rss_reader.single', feed_id=feed_id))
+
+    handle_finished_jobs(g.user.id)
 
     items = Item.query. \
         join(Feed). \
@@ -47,7 +67,8 @@ def single(feed_id):
     # Get the given feed entry from db
     single_feed = Feed.query.filter_by(id=feed_id).first()
 
-    return render_template('rss_reader/single.html', items=items, feeds=feeds, single_feed=single_feed, refresh=refresh)
+    return render_template('rss_reader/single.html', items=items, feeds=feeds, single_feed=single_feed,
+                           refresh_pending=is_refresh_pending(feed_id))
 
 
 @bp.route('/add_feed', methods=('GET', 'POST'))
@@ -65,47 +86,9 @@ def add_feed():
 
         else:
 
-            parsed_feed = parse_feed(xml_href)
-
-            if not well_formed(parsed_feed):
-
-                error = 'Feed is not well-formed!'
-                flash(error)
-
-            else:
-
-                title = parsed_feed.feed.get('title', 'No title')
-                # TODO add html parsing to extract text and img link in description:
-                description = parsed_feed.feed.get('description', 'No description')
-                link = parsed_feed.feed.get('link', 'No link')
-
-                # Check whether feed already exists in database
-                found_feed = Feed.query.filter_by(title=title).first()
-
-                # Check whether relation to given user exists
-                current_user = get_user_by_id(g.user.id)
-
-                if found_feed:
-
-                    if current_user.id in [user.id for user in found_feed.users]:
-
-                        error = 'Feed was already added!'
-                        flash(error)
-
-                    # If feed exists but no relation to user exists yet, create one
-                    else:
-                        current_user.feeds.append(found_feed)
-                        db.session.commit()
-
-                # If feed doesn't exist at all in database, add it and create relation to given user
-                else:
-
-                    feed_entry = Feed(title=title, description=description, link=link, href=xml_href)
-                    current_user.feeds.append(feed_entry)
-                    db.session.commit()
-
-                    # After committing, the model will have the id property set
-                    update_feed_db(feed_entry.id, parsed_feed)
+            # The refresh worker fetches the feed and subscribes the user to it, failures are shown on the next page
+            enqueue_add_feed(xml_href, g.user.id)
+            flash(PENDING_MESSAGE)
 
             return redirect(url_for('rss_reader.latest'))
 
@@ -124,9 +107,13 @@ def delete_feed():
 
         feed_to_be_deleted = Feed.query.filter_by(title=chosen_feed_title).first()
         current_user = get_user_by_id(g.user.id)
-        current_user.feeds.remove(feed_to_be_deleted)
 
-        db.session.commit()
+        # The dropdown of another process may still list a feed which was already deleted
+        if feed_to_be_deleted in current_user.feeds:
+            current_user.feeds.remove(feed_to_be_deleted)
+
+            db.session.commit()
+            bump_feedlist_version()
 
         return redirect(url_for('rss_reader.latest'))
 
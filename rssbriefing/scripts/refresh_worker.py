@@ -0,0 +1,62 @@
+import argparse
+import time
+
+from rssbriefing import create_app
+from rssbriefing.refresh_jobs import claim_next_job, process_job, process_pending_jobs, requeue_stale_jobs
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-i', '--interval',
+                        type=float,
+                        help="Seconds to wait for new jobs while the queue is empty. "
+                             "Defaults to REFRESH_WORKER_POLL_INTERVAL of the app config.")
+    parser.add_argument('-t', '--timeout',
+                        type=float,
+                        help="Socket timeout in seconds per feed. Defaults to FEED_FETCH_TIMEOUT of the app config.")
+    parser.add_argument('-o', '--once',
+                        action='store_true',
+                        help="Process the pending jobs and exit, instead of waiting for new jobs.")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # Set up app context to be able to access extensions such as SQLAlchemy when this module is run independently
+    app = create_app()
+    app.app_context().push()
+
+    interval = args.interval or app.config['REFRESH_WORKER_POLL_INTERVAL']
+    timeout = args.timeout or app.config['FEED_FETCH_TIMEOUT']
+
+    # Jobs left running by a worker which died are picked up again
+    requeued = requeue_stale_jobs(app.config['REFRESH_JOB_TIMEOUT'])
+    app.logger.info(f'Refresh worker started, requeued {requeued} stale jobs.')
+
+    if args.once:
+        processed = process_pending_jobs(app, timeout=timeout)
+        app.logger.info(f'Processed {processed} jobs.')
+        return
+
+    while True:
+        job = claim_next_job()
+
+        if job is None:
+            # Jobs of another worker which died meanwhile are picked up again while this one is idle
+            requeued = requeue_stale_jobs(app.config['REFRESH_JOB_TIMEOUT'])
+            if requeued:
+                app.logger.info(f'Requeued {requeued} stale jobs.')
+                continue
+
+            time.sleep(interval)
+            continue
+
+        app.logger.info(f'Processing {job}...')
+        process_job(app, job, timeout=timeout)
+
+
+if __name__ == '__main__':
+    main()
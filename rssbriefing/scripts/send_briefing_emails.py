@@ -1,13 +1,12 @@
 import argparse
 import sys
-from textwrap import TextWrapper
 from datetime import datetime
-from flask import render_template
 
 from rssbriefing import create_app
 from rssbriefing.briefing_utils import get_standard_briefing
 from rssbriefing.db_utils import get_user_by_id, get_all_users
-from rssbriefing.email import send_single_mail
+from rssbriefing.email import get_briefing_email
+from rssbriefing.email_dispatch import dispatch_emails
 
 
 def parse_args():
@@ -22,6 +21,15 @@ def parse_args():
     command_group.add_argument('-A', '--All',
                                action='store_true',
                                help="Send briefing to all users. Arguments '-u' and '-A' are mutually exclusive.")
+    parser.add_argument('-b', '--batch_size',
+                        type=int,
+                        help="Max. number of emails per SMTP connection. Defaults to EMAIL_BATCH_SIZE of the app config.")
+    parser.add_argument('-r', '--rate_limit',
+                        type=float,
+                        help="Max. number of emails per second. Defaults to EMAIL_RATE_LIMIT of the app config.")
+    parser.add_argument('-w', '--workers',
+                        type=int,
+                        help="Number of concurrent SMTP connections. Defaults to EMAIL_WORKERS of the app config.")
 
     return parser.parse_args()
 
@@ -51,24 +59,27 @@ def main():
             f'Latest briefing was generated on {latest_briefing_date} and contains {len(briefing_items)} items.')
 
         if briefing_items:
-            # Wrap each summary into a paragraph of max width 70 chars
-            wrapper = TextWrapper()
-            for item in briefing_items:
-                item.title = wrapper.fill(item.title)
-                item.summary = wrapper.fill(item.summary)
-
             today = datetime.now()
             weekday_str = today.strftime('%A')
 
-            for user in users:
-                app.logger.info(f'Sending briefing for user {user}...')
-                send_single_mail(subject=f"Your {weekday_str} RoboBriefing",
-                                 from_email=app.config['ADMINS'][0],
-                                 recipient_list=[user.email],
-                                 text_body=render_template('briefing/briefing_email.txt',
-                                                           user=user, items=briefing_items,
-                                                           briefing_date=latest_briefing_date))
-    except:
+            # Render the briefing once, only the recipient is filled in per user
+            briefing_email = get_briefing_email(briefing_items, latest_briefing_date, weekday_str)
+            recipients = [(user.id, briefing_email.message_for(user.email)) for user in users]
+
+            # Users who already got this briefing, e.g. from an aborted previous run, are skipped
+            app.logger.info(f'Sending briefing to {len(recipients)} users...')
+            counts = dispatch_emails(app, recipients,
+                                     briefing_created=briefing_items[0].briefing_created,
+                                     workers=args.workers or app.config['EMAIL_WORKERS'],
+                                     batch_size=args.batch_size or app.config['EMAIL_BATCH_SIZE'],
+                                     rate_limit=args.rate_limit or app.config['EMAIL_RATE_LIMIT'],
+                                     max_retries=app.config['EMAIL_MAX_RETRIES'],
+                                     retry_delay=app.config['EMAIL_RETRY_DELAY'])
+
+            app.logger.info(f'Briefing sent to {counts["sent"]} users, failed for {counts["failed"]} users, '
+                            f'skipped {counts["skipped"]} users who already got it.')
+
+    except Exception:
         app.logger.error('Unhandled exception', exc_info=sys.exc_info())
 
 
@@ -1,32 +1,83 @@
+import argparse
 import socket
 from tqdm import tqdm
 
 from rssbriefing import create_app
-from rssbriefing.feed import get_latest_feed_dict, update_feed_db
+from rssbriefing import db
+from rssbriefing.feed import fetch_feeds, update_feed_db, not_modified, update_feed_validators
+from rssbriefing.feed_scheduler import get_due_feeds, get_publishing_intervals, schedule_next_poll
 from rssbriefing.models import Feed
 
 # Set timeout in seconds for new socket objects, needed for feedparser connections
 socket.setdefaulttimeout(10)
 
 
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-w', '--workers',
+                        type=int,
+                        help="Number of feeds fetched concurrently. Defaults to FEED_FETCH_WORKERS of the app config.")
+    parser.add_argument('-p', '--per_host',
+                        type=int,
+                        help="Max number of concurrent fetches against the same host. "
+                             "Defaults to FEED_FETCH_PER_HOST of the app config.")
+    parser.add_argument('-t', '--timeout',
+                        type=float,
+                        help="Socket timeout in seconds per feed. Defaults to FEED_FETCH_TIMEOUT of the app config.")
+    parser.add_argument('-A', '--All',
+                        action='store_true',
+                        help="Poll all feeds, instead of only the feeds which are due according to their schedule.")
+
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+
     # Set up app context to be able to access extensions such as SQLAlchemy when this module is run independently
     app = create_app()
     app.app_context().push()
 
-    # Get all feeds
-    feeds = Feed.query.all()
+    workers = args.workers or app.config['FEED_FETCH_WORKERS']
+    per_host = args.per_host or app.config['FEED_FETCH_PER_HOST']
+    timeout = args.timeout or app.config['FEED_FETCH_TIMEOUT']
+
+    # Get all feeds or only the ones due for polling
+    feeds = Feed.query.all() if args.All else get_due_feeds()
+    feeds = {feed.id: feed for feed in feeds}
+    feed_hrefs = [(feed.id, feed.href) for feed in feeds.values()]
+    validators = {feed.id: (feed.etag, feed.modified) for feed in feeds.values()}
+
+    publishing_intervals = get_publishing_intervals()
+
+    app.logger.info(f'Updating a total of {len(feeds)} feeds with {workers} workers...')
+
+    # Count conditional GET hits (304 Not Modified) and misses (full download)
+    hits, misses = 0, 0
+
+    # Network fetches overlap in the worker threads, the db writes happen one after another in this thread
+    for feed_id, feed_dict in tqdm(fetch_feeds(feed_hrefs, workers=workers, per_host=per_host, timeout=timeout,
+                                               validators=validators),
+                                   total=len(feed_hrefs)):
+        feed = feeds[feed_id]
+        update_feed_validators(feed, feed_dict)
 
-    app.logger.info(f'Updating a total of {len(feeds)} feeds...')
+        if not_modified(feed_dict):
+            app.logger.info(f'Feed: {feed.title} not modified since the last update.')
+            hits += 1
+            new_items = 0
 
-    for feed in tqdm(feeds):
-        app.logger.info(f'Getting the latest posts from feed: {feed.title}')
-        feed_dict = get_latest_feed_dict(feed_id=feed.id)
+        else:
+            misses += 1
+            app.logger.info(f'Writing the latest posts of feed: {feed.title} to db...')
+            new_items = update_feed_db(feed_id=feed_id, feed_dict=feed_dict)
+            app.logger.info(f'Done, {new_items} new posts.')
 
-        app.logger.info(f'Writing the latest posts of feed: {feed.title} to db...')
-        update_feed_db(feed_id=feed.id, feed_dict=feed_dict)
-        app.logger.info('Done.')
+        schedule_next_poll(feed, new_items, publishing_intervals.get(feed_id))
+        db.session.commit()
 
+    app.logger.info(f'Conditional GET hits (not modified): {hits}, misses (downloaded): {misses}.')
     app.logger.info('Done with all feeds.')
 
 
@@ -2,7 +2,9 @@ import pytest
 from flask import g, session
 
 
-from rssbriefing.db_utils import get_user_by_username
+from rssbriefing import db
+from rssbriefing.db_utils import get_user_by_username, get_user_by_id, get_user_record, UserRecord
+from rssbriefing.models import Users
 
 
 def test_register(client, app):
@@ -56,3 +58,38 @@ def test_logout(client, auth):
     with client:
         auth.logout()
         assert 'user_id' not in session
+
+
+def test_logged_in_user_is_cached(client, auth, app):
+    auth.login()
+
+    with client:
+        client.get('/')
+        assert g.user == UserRecord(1, 'test', 'test@testdomain.com')
+
+    # Changed in the db by another process: Cached record is served until it expires or is invalidated
+    with app.app_context():
+        Users.query.get(1).email = 'changed@testdomain.com'
+        db.session.commit()
+
+        assert get_user_record(1).email == 'test@testdomain.com'
+
+    # Templates read the username from the record
+    response = client.get('/example')
+    assert b'aria-disabled="true">test</a>' in response.data
+
+
+def test_reset_password_invalidates_cached_user(client, app):
+    with app.app_context():
+        assert get_user_record(1).username == 'test'
+
+        token = get_user_by_id(1).get_reset_password_token()
+        Users.query.get(1).username = 'renamed'
+        db.session.commit()
+
+    # The test app has CSRF protection enabled for the flask-wtf forms
+    app.config['WTF_CSRF_ENABLED'] = False
+    client.post(f'/auth/reset_password/{token}', data={'password': 'new', 'password2': 'new'})
+
+    with app.app_context():
+        assert get_user_record(1).username == 'renamed'
@@ -1,9 +1,13 @@
 from rssbriefing.db_utils import get_feedlist_for_dropdown
+from rssbriefing.refresh_jobs import process_pending_jobs
 
 
 def add_one_feed_to_users_feedlist(client):
     client.post('/add_feed', data={'xml_href': 'https://rss.nytimes.com/services/xml/rss/nyt/HomePage.xml'})
 
+    # The feed is fetched in the background by the refresh worker
+    process_pending_jobs(client.application)
+
 
 
 # """ Commented out since Log in and Register removed from Navbar: """
@@ -0,0 +1,89 @@
+from datetime import datetime
+
+from rssbriefing import db
+from rssbriefing.cache import TTLCache
+from rssbriefing.models import Briefing, Feed
+
+
+def add_briefing(app, title, briefing_created):
+    with app.app_context():
+        if Feed.query.filter_by(title='Test feed').first() is None:
+            db.session.add(Feed(title='Test feed', link='https://example.com'))
+
+        db.session.add(Briefing(title=title, summary=f'Summary of {title}', link='https://example.com/0',
+                                feed_title='Test feed', user_id=1, briefing_created=briefing_created, guid='1'))
+        db.session.commit()
+
+
+def test_ttl_cache_expires_and_evicts(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('rssbriefing.cache.time.monotonic', lambda: now[0])
+
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+
+    # 'b' is the least recently used entry
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+
+    now[0] = 11
+    assert cache.get('a') is None
+    assert cache.get_or_set('a', lambda: 4) == 4
+
+
+def test_example_is_cached_until_expired(client, app, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('rssbriefing.cache.time.monotonic', lambda: now[0])
+    add_briefing(app, 'First briefing', datetime(2020, 5, 1, 6))
+
+    response = client.get('/example')
+    assert response.status_code == 200
+    assert b'First briefing' in response.data
+
+    # New batch written by the briefing generation script: Served from the cache until the cache expires
+    add_briefing(app, 'Second briefing', datetime(2020, 5, 2, 6))
+    assert b'Second briefing' not in client.get('/example').data
+
+    now[0] += app.config.get('BRIEFING_CACHE_TTL', 60) + 1
+
+    response = client.get('/example')
+    assert b'Second briefing' in response.data
+    assert b'First briefing' not in response.data
+
+
+def test_example_etag(client, app, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('rssbriefing.cache.time.monotonic', lambda: now[0])
+    add_briefing(app, 'First briefing', datetime(2020, 5, 1, 6))
+
+    response = client.get('/example')
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    response = client.get('/example', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+    # A new briefing changes the ETag
+    add_briefing(app, 'Second briefing', datetime(2020, 5, 2, 6))
+    now[0] += app.config.get('BRIEFING_CACHE_TTL', 60) + 1
+
+    response = client.get('/example', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_example_not_cached_for_logged_in_user(client, auth, app):
+    add_briefing(app, 'First briefing', datetime(2020, 5, 1, 6))
+
+    auth.login()
+    response = client.get('/example')
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+    assert b'Log Out' in response.data
+
+    # The index renders the cached items of the briefing
+    assert b'First briefing' in client.get('/').data
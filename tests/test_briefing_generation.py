@@ -0,0 +1,32 @@
+import os
+
+import pytest
+
+# The briefing generation needs the optional model dependencies (gensim, spaCy, torch, transformers, newspaper)
+briefing = pytest.importorskip('rssbriefing.briefing_model.briefing')
+
+from rssbriefing.db_utils import get_user_by_id  # noqa: E402
+
+
+def test_generate_briefings_in_worker_processes(app, monkeypatch):
+    summarizer_pids = []
+
+    def stub_summarizer(app):
+        summarizer_pids.append(os.getpid())
+
+    def stub_generate_user_briefing(app, user_id, topic_model, *args):
+        # Uses the db connection and the summarization model of the worker process
+        if get_user_by_id(user_id).username == 'other':
+            raise ValueError('Ranking failed')
+
+        return summarizer_pids.count(os.getpid())
+
+    monkeypatch.setattr(briefing, 'get_summarizer', stub_summarizer)
+    monkeypatch.setattr(briefing, 'generate_user_briefing', stub_generate_user_briefing)
+
+    with app.app_context():
+        results = briefing.generate_briefings(app, [1, 2], topic_model=object(), workers=2)
+
+    # Each worker loaded the summarization model once, the parent didn't load it at all
+    assert results == {1: 1, 2: None}
+    assert summarizer_pids == []
@@ -0,0 +1,149 @@
+import email
+import smtplib
+from types import SimpleNamespace
+
+from django.core.mail import EmailMessage
+from django.core.mail.backends.locmem import EmailBackend
+from flask import render_template
+from jinja2 import ChoiceLoader, DictLoader
+
+# Configures the Django settings of the email backend
+import config  # noqa: F401
+from rssbriefing.email import PrerenderedEmail, PrerenderedEmailMessage, get_briefing_email, send_bulk_mails, \
+    wrap_briefing_items
+
+
+class FlakyBackend(EmailBackend):
+    """ locmem backend which counts its sessions and drops the connection on the given sends. """
+
+    def __init__(self, fail_on=(), **kwargs):
+        super().__init__(**kwargs)
+        self.fail_on = set(fail_on)
+        self.sent = []
+        self.sends = 0
+        self.sessions = 0
+
+    def open(self):
+        self.sessions += 1
+
+    def send_messages(self, messages):
+        self.sends += 1
+        if self.sends in self.fail_on:
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+
+        self.sent.extend(messages)
+        return len(messages)
+
+
+def get_messages(nr_messages):
+    return [EmailMessage('Briefing', 'Body', 'from@domain.net', [f'user{idx}@domain.net'])
+            for idx in range(nr_messages)]
+
+
+def test_send_bulk_mails_reuses_connection_per_batch(app):
+    connection = FlakyBackend()
+
+    with app.app_context():
+        failed = send_bulk_mails(get_messages(10), connection=connection, batch_size=4)
+
+    assert failed == []
+    assert len(connection.sent) == 10
+    # One session per batch of 4 messages, not one per message
+    assert connection.sessions == 3
+
+
+def test_send_bulk_mails_retries_failed_messages(app):
+    connection = FlakyBackend(fail_on=[2, 3])
+    messages = get_messages(5)
+
+    with app.app_context():
+        failed = send_bulk_mails(messages, connection=connection, batch_size=10, retry_delay=0)
+
+    assert failed == []
+    assert sorted(message.to[0] for message in connection.sent) == sorted(message.to[0] for message in messages)
+
+
+def test_send_bulk_mails_gives_up_after_max_retries(app):
+    connection = FlakyBackend(fail_on=range(2, 100))
+
+    with app.app_context():
+        failed = send_bulk_mails(get_messages(3), connection=connection, max_retries=1, retry_delay=0)
+
+    assert [message.to for message in failed] == [['user1@domain.net'], ['user2@domain.net']]
+
+
+def get_briefing_items():
+    return [SimpleNamespace(title='Central bank holds rates steady', summary='The central bank kept its benchmark '
+                            'interest rate unchanged on Wednesday and signalled ongoing support. ' * 3,
+                            feed_title='Test feed', link='https://example.com/0')]
+
+
+def test_prerendered_email_matches_rendered_email(app):
+    items = get_briefing_items()
+    summary = items[0].summary
+    app.config['ADMINS'] = ['robobriefing@domain.net']
+
+    with app.app_context():
+        briefing_email = get_briefing_email(items, 'June 01, 2020 at 06:00 AM', 'Monday')
+        message = briefing_email.message_for('zoe@domain.net')
+
+        body = render_template('briefing/briefing_email.txt', items=wrap_briefing_items(items),
+                               briefing_date='June 01, 2020 at 06:00 AM')
+        reference = EmailMessage(message.subject, body, message.from_email, message.to).message()
+        reference = email.message_from_bytes(reference.as_bytes(linesep='\r\n'))
+
+    assert isinstance(message, PrerenderedEmailMessage)
+    assert message.body == body
+    assert message.body.startswith('Good morning!\n')
+    # Items are wrapped into copies
+    assert items[0].summary == summary
+
+    parsed = email.message_from_bytes(message.message().as_bytes(linesep='\r\n'))
+    for header in ('Subject', 'From', 'To', 'Content-Type', 'Content-Transfer-Encoding', 'MIME-Version'):
+        assert parsed[header] == reference[header]
+    assert parsed['Message-ID'] and parsed['Date']
+
+    assert parsed.get_payload(decode=True) == reference.get_payload(decode=True)
+    assert parsed.get_payload(decode=True).decode('utf-8') == message.body.replace('\n', '\r\n')
+
+
+def test_prerendered_email_falls_back_for_long_lines(app):
+    with app.app_context():
+        briefing_email = PrerenderedEmail('Subject', 'from@domain.net', 'briefing/briefing_email.txt',
+                                          items=[dict(title='x' * 1000)], briefing_date='today')
+
+    message = briefing_email.message_for('user@domain.net')
+    assert not briefing_email.prerendered
+    assert not isinstance(message, PrerenderedEmailMessage)
+
+
+def test_prerendered_email_encodes_display_names(app):
+    with app.app_context():
+        briefing_email = PrerenderedEmail('Subject', 'from@domain.net', 'briefing/briefing_email.txt', items=[],
+                                          briefing_date='today')
+
+    message = briefing_email.message_for('Zoë <zoe@domain.net>')
+    reference = EmailMessage('Subject', message.body, 'from@domain.net', message.to).message()
+
+    parsed = email.message_from_bytes(message.message().as_bytes())
+    assert parsed['To'] == reference['To']
+
+
+def test_prerendered_email_ignores_placeholder_lookalikes(app):
+    items = [dict(title='Title @@greeting@@', summary='Café summary @@foo@@')]
+    # Template with a per-recipient field, the briefing email has none
+    app.jinja_env.loader = ChoiceLoader([DictLoader({'greeting.txt': '{{ greeting }}\n{% for item in items %}'
+                                                                     '{{ item.title }}\n{{ item.summary }}\n'
+                                                                     '{% endfor %}'}),
+                                         app.jinja_env.loader])
+
+    with app.app_context():
+        briefing_email = PrerenderedEmail('Subject', 'from@domain.net', 'greeting.txt', fields=('greeting',),
+                                          items=items)
+
+    message = briefing_email.message_for('user@domain.net', greeting='Hello!')
+    assert message.body.startswith('Hello!\n')
+    assert 'Title @@greeting@@' in message.body and 'Café summary @@foo@@' in message.body
+
+    parsed = email.message_from_bytes(message.message().as_bytes())
+    assert parsed.get_payload(decode=True).decode('utf-8') == message.body
@@ -0,0 +1,104 @@
+import smtplib
+from datetime import datetime
+
+from django.core.mail import EmailMessage
+from django.core.mail.backends.base import BaseEmailBackend
+
+from rssbriefing import db
+from rssbriefing.email_dispatch import FAILED, PENDING, SENT, dispatch_emails
+from rssbriefing.models import DeliveryLog, Users
+
+BRIEFING_CREATED = datetime(2020, 6, 1, 6)
+
+
+class RecordingBackend(BaseEmailBackend):
+    """ Records the recipients of the sent messages, refuses the addresses in refuse. """
+
+    def __init__(self, sent, refuse=(), **kwargs):
+        super().__init__(**kwargs)
+        self.sent = sent
+        self.refuse = set(refuse)
+
+    def send_messages(self, messages):
+        for message in messages:
+            if message.to[0] in self.refuse:
+                raise smtplib.SMTPRecipientsRefused({message.to[0]: (450, b'Mailbox busy')})
+
+            self.sent.append(message.to[0])
+
+        return len(messages)
+
+
+def add_users(nr_users):
+    users = [Users(username=f'user{idx}', email=f'user{idx}@domain.net') for idx in range(nr_users)]
+    db.session.add_all(users)
+    db.session.commit()
+
+    return users
+
+
+def get_recipients(users):
+    return [(user.id, EmailMessage('Briefing', 'Body', 'from@domain.net', [user.email])) for user in users]
+
+
+def test_dispatch_logs_each_recipient(app):
+    sent = []
+
+    with app.app_context():
+        users = add_users(20)
+
+        counts = dispatch_emails(app, get_recipients(users), BRIEFING_CREATED, workers=4, batch_size=3,
+                                 connection_factory=lambda: RecordingBackend(sent))
+
+        assert counts == {'sent': 20, 'failed': 0, 'skipped': 0}
+        assert sorted(sent) == sorted(user.email for user in users)
+
+        logs = DeliveryLog.query.all()
+        assert len(logs) == 20
+        assert all(log.status == SENT and log.attempts == 1 for log in logs)
+
+
+def test_dispatch_resumes_with_undelivered_recipients(app):
+    sent = []
+
+    with app.app_context():
+        users = add_users(10)
+        refused = {users[2].email, users[7].email}
+
+        counts = dispatch_emails(app, get_recipients(users), BRIEFING_CREATED, workers=3, max_retries=1,
+                                 retry_delay=0, connection_factory=lambda: RecordingBackend(sent, refused))
+
+        assert counts == {'sent': 8, 'failed': 2, 'skipped': 0}
+        failed = DeliveryLog.query.filter_by(status=FAILED).all()
+        assert sorted(log.user_id for log in failed) == sorted([users[2].id, users[7].id])
+        assert all(log.attempts == 2 and 'Mailbox busy' in log.error for log in failed)
+
+        # The rerun only sends to the recipients which didn't get the briefing yet
+        sent.clear()
+        counts = dispatch_emails(app, get_recipients(users), BRIEFING_CREATED, workers=3,
+                                 connection_factory=lambda: RecordingBackend(sent))
+
+        assert counts == {'sent': 2, 'failed': 0, 'skipped': 8}
+        assert sorted(sent) == sorted(refused)
+        assert DeliveryLog.query.filter_by(status=SENT).count() == 10
+
+        # A new briefing is sent to everyone
+        sent.clear()
+        counts = dispatch_emails(app, get_recipients(users), datetime(2020, 6, 2, 6),
+                                 connection_factory=lambda: RecordingBackend(sent))
+        assert counts == {'sent': 10, 'failed': 0, 'skipped': 0}
+
+
+def test_dispatch_keeps_unsent_recipients_pending(app):
+
+    def failing_factory():
+        raise ConnectionRefusedError('SMTP server is down')
+
+    with app.app_context():
+        users = add_users(3)
+
+        counts = dispatch_emails(app, get_recipients(users), BRIEFING_CREATED, workers=2,
+                                 connection_factory=failing_factory)
+
+        assert counts == {'sent': 0, 'failed': 3, 'skipped': 0}
+        assert DeliveryLog.query.filter_by(status=PENDING).count() == 3
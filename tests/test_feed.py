@@ -0,0 +1,260 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import feedparser
+import html2text
+import pytest
+
+from rssbriefing import db
+from rssbriefing.feed import HostLimiter, entry_key, fetch_feeds, html_to_text, interleave_by_host, not_modified, \
+    parse_feed, update_feed_db, update_feed_validators
+from rssbriefing.feed_scheduler import get_due_feeds, get_publishing_intervals, schedule_next_poll
+from rssbriefing.models import Feed, Item
+
+RSS = """<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0">
+    <channel>
+        <title>Test feed {idx}</title>
+        <item>
+            <title>Entry of feed {idx}</title>
+            <link>https://example.com/{idx}</link>
+            <description>Description of feed {idx}</description>
+        </item>
+    </channel>
+</rss>"""
+
+
+def test_interleave_by_host():
+    feed_hrefs = [(1, 'https://a.com/1'), (2, 'https://a.com/2'), (3, 'https://a.com/3'),
+                  (4, 'https://b.com/1'), (5, 'https://c.com/1')]
+
+    assert [feed_id for feed_id, _ in interleave_by_host(feed_hrefs)] == [1, 4, 5, 2, 3]
+
+
+def test_host_limiter():
+    limiter = HostLimiter(per_host=2)
+    running = {'a.com': 0, 'b.com': 0}
+    peak = {'a.com': 0, 'b.com': 0}
+    lock = threading.Lock()
+
+    def fetch(host):
+        with limiter.limit(f'https://{host}/feed'):
+            with lock:
+                running[host] += 1
+                peak[host] = max(peak[host], running[host])
+            time.sleep(0.05)
+            with lock:
+                running[host] -= 1
+
+    threads = [threading.Thread(target=fetch, args=(host,)) for host in ['a.com', 'b.com'] * 4]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak == {'a.com': 2, 'b.com': 2}
+
+
+def test_fetch_feeds():
+    # feedparser also accepts the raw XML document instead of an URL
+    feed_hrefs = [(idx, RSS.format(idx=idx)) for idx in range(5)]
+
+    results = dict(fetch_feeds(feed_hrefs, workers=3))
+
+    assert sorted(results) == list(range(5))
+    for idx, feed_dict in results.items():
+        assert feed_dict.feed.title == f'Test feed {idx}'
+        assert len(feed_dict.entries) == 1
+
+
+@pytest.fixture
+def etag_server():
+    """ Local HTTP server which answers conditional GETs with a matching ETag with 304 Not Modified. """
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.headers.get('If-None-Match') == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+
+            body = RSS.format(idx=0).encode('utf-8')
+            self.send_response(200)
+            self.send_header('ETag', '"v1"')
+            self.send_header('Last-Modified', 'Mon, 01 Jun 2020 08:00:00 GMT')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield f'http://127.0.0.1:{server.server_address[1]}/feed.xml'
+
+    server.shutdown()
+
+
+def test_conditional_get(etag_server):
+    feed = Feed(href=etag_server)
+
+    feed_dict = parse_feed(feed.href, etag=feed.etag, modified=feed.modified)
+    update_feed_validators(feed, feed_dict)
+
+    assert not not_modified(feed_dict)
+    assert len(feed_dict.entries) == 1
+    assert (feed.etag, feed.modified, feed.last_status) == ('"v1"', 'Mon, 01 Jun 2020 08:00:00 GMT', 200)
+
+    feed_dict = parse_feed(feed.href, etag=feed.etag, modified=feed.modified)
+    update_feed_validators(feed, feed_dict)
+
+    assert not_modified(feed_dict)
+    assert len(feed_dict.entries) == 0
+    assert (feed.etag, feed.modified, feed.last_status) == ('"v1"', 'Mon, 01 Jun 2020 08:00:00 GMT', 304)
+
+
+def test_update_feed_db_deduplicates(app):
+    first = feedparser.parse("""<rss version="2.0"><channel><title>Dedup</title>
+        <item><title>One</title><guid>guid-1</guid><link>https://example.com/1</link></item>
+        <item><title>Two</title><link>https://example.com/2</link></item>
+        <item><title>Two</title><link>https://example.com/2</link></item>
+    </channel></rss>""")
+    second = feedparser.parse("""<rss version="2.0"><channel><title>Dedup</title>
+        <item><title>One, edited</title><guid>guid-1</guid><link>https://example.com/1</link></item>
+        <item><title>Two</title><link>https://example.com/2</link></item>
+        <item><title>Three</title><link>https://example.com/3</link></item>
+    </channel></rss>""")
+
+    with app.app_context():
+        feed = Feed(title='Dedup', href='https://example.com/feed.xml')
+        db.session.add(feed)
+        db.session.commit()
+
+        assert update_feed_db(feed.id, first) == 2
+        assert update_feed_db(feed.id, second) == 1
+        assert update_feed_db(feed.id, second) == 0
+
+        guids = sorted(item.guid for item in Item.query.filter_by(feed_id=feed.id))
+        assert guids == sorted(['guid-1', entry_key(first.entries[1]), entry_key(second.entries[2])])
+
+
+def test_update_feed_db_inserts_in_chunks(app):
+    entries = ''.join(f'<item><title>Entry {idx}</title><guid>guid-{idx}</guid><link>https://example.com/{idx}</link>'
+                      f'</item>' for idx in range(400))
+    parsed = feedparser.parse(f'<rss version="2.0"><channel><title>Long</title>{entries}</channel></rss>')
+
+    with app.app_context():
+        feed = Feed(title='Long', href='https://example.com/feed.xml')
+        db.session.add(feed)
+        db.session.commit()
+
+        assert update_feed_db(feed.id, parsed) == 400
+        assert update_feed_db(feed.id, parsed) == 0
+        assert Item.query.filter_by(feed_id=feed.id).count() == 400
+
+
+def test_update_feed_db_matches_items_without_guid(app):
+    parsed = feedparser.parse("""<rss version="2.0"><channel><title>Legacy</title>
+        <item><title>One</title><guid>guid-1</guid><link>https://example.com/1</link></item>
+        <item><title>Two</title><link>https://example.com/2</link></item>
+    </channel></rss>""")
+
+    with app.app_context():
+        feed = Feed(title='Legacy', href='https://example.com/feed.xml')
+        db.session.add(feed)
+        db.session.commit()
+
+        # Stored before the entry keys were introduced
+        db.session.add(Item(title='One', link='https://example.com/1', feed_id=feed.id))
+        db.session.commit()
+
+        assert update_feed_db(feed.id, parsed) == 1
+        assert update_feed_db(feed.id, parsed) == 0
+
+        items = Item.query.filter_by(feed_id=feed.id).order_by(Item.id).all()
+        assert [(item.link, item.guid) for item in items] == [('https://example.com/1', 'guid-1'),
+                                                               ('https://example.com/2', entry_key(parsed.entries[1]))]
+
+
+@pytest.mark.parametrize('text', (
+        'Stocks Rise as Investors Look Past Unrest',
+        '1. The key questions on the new rules answered',
+        '- dash\n+ plus\n  2. numbered \\*escaped\\*  ',
+        '\u00a0Spain\u2019s  health ministry\r\n',
+        'AT&T cuts prices',
+        '<p>Lawmakers <a href="https://example.com">agree</a></p><img src="x.jpg">',
+        '<pre>unclosed',
+        'after unclosed',
+))
+def test_html_to_text(text):
+    text_maker = html2text.HTML2Text()
+    text_maker.ignore_links = True
+    text_maker.ignore_images = True
+    text_maker.body_width = 0
+
+    assert html_to_text.handle(text) == text_maker.handle(text)
+
+
+@pytest.fixture
+def schedule_config(app):
+    app.config.update(FEED_POLL_MIN_INTERVAL=15,
+                      FEED_POLL_MAX_INTERVAL=24 * 60,
+                      FEED_POLL_HISTORY_DAYS=7,
+                      FEED_POLL_BACKOFF_FACTOR=2)
+    return app
+
+
+def test_publishing_intervals_and_due_feeds(schedule_config):
+    now = datetime(2020, 6, 1, 12, 0)
+
+    with schedule_config.app_context():
+        hot = Feed(title='Hot', href='https://example.com/hot.xml', next_update=now - timedelta(minutes=1))
+        cold = Feed(title='Cold', href='https://example.com/cold.xml', next_update=now + timedelta(hours=1))
+        new = Feed(title='New', href='https://example.com/new.xml')
+        db.session.add_all([hot, cold, new])
+        db.session.commit()
+
+        # 7 days of history: 7 * 24 items of the hot feed, 2 items of the cold feed and one outdated item
+        db.session.add_all([Item(title=f'Hot {idx}', link='https://example.com', feed_id=hot.id,
+                                 created=now - timedelta(hours=idx)) for idx in range(7 * 24)])
+        db.session.add_all([Item(title=f'Cold {idx}', link='https://example.com', feed_id=cold.id,
+                                 created=now - timedelta(days=idx + 1)) for idx in range(2)])
+        db.session.add(Item(title='Outdated', link='https://example.com', feed_id=new.id,
+                            created=now - timedelta(days=30)))
+        db.session.commit()
+
+        assert get_publishing_intervals(now) == {hot.id: timedelta(hours=1), cold.id: timedelta(days=3.5)}
+        assert sorted(feed.title for feed in get_due_feeds(now)) == ['Hot', 'New']
+
+
+def test_schedule_next_poll(schedule_config):
+    now = datetime(2020, 6, 1, 12, 0)
+    feed = Feed(empty_polls=0)
+
+    with schedule_config.app_context():
+        schedule_next_poll(feed, new_items=3, publishing_interval=timedelta(hours=1), now=now)
+        assert (feed.next_update, feed.empty_polls) == (now + timedelta(hours=1), 0)
+
+        # Bounded by the min interval
+        schedule_next_poll(feed, new_items=3, publishing_interval=timedelta(minutes=1), now=now)
+        assert feed.next_update == now + timedelta(minutes=15)
+
+        # Back off after unproductive polls, bounded by the max interval
+        schedule_next_poll(feed, new_items=0, publishing_interval=timedelta(hours=1), now=now)
+        assert (feed.next_update, feed.empty_polls) == (now + timedelta(hours=2), 1)
+
+        schedule_next_poll(feed, new_items=0, publishing_interval=timedelta(hours=1), now=now)
+        assert (feed.next_update, feed.empty_polls) == (now + timedelta(hours=4), 2)
+
+        feed.empty_polls = 1000
+        schedule_next_poll(feed, new_items=0, publishing_interval=timedelta(hours=1), now=now)
+        assert feed.next_update == now + timedelta(days=1)
+
+        # Unknown publishing interval
+        schedule_next_poll(feed, new_items=1, now=now)
+        assert (feed.next_update, feed.empty_polls) == (now + timedelta(days=1), 0)
@@ -0,0 +1,165 @@
+from datetime import datetime, timedelta
+
+from rssbriefing import create_app, db
+from rssbriefing.db_utils import get_feedlist_for_dropdown
+from rssbriefing.models import Feed, Item, RefreshJob, Users
+from rssbriefing.refresh_jobs import PENDING, RUNNING, DONE, FAILED, ADD_FEED, claim_next_job, enqueue_add_feed, \
+    process_pending_jobs, requeue_stale_jobs
+
+# feedparser also accepts the raw XML document instead of an URL
+RSS = """<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0">
+    <channel>
+        <title>Test feed</title>
+        <item>
+            <title>Entry of the test feed</title>
+            <link>https://example.com/0</link>
+            <description>Description of the test feed</description>
+        </item>
+    </channel>
+</rss>"""
+
+
+def test_add_feed_is_processed_in_background(client, auth, app):
+    auth.login()
+
+    response = client.post('/add_feed', data={'xml_href': RSS})
+    assert response.headers['Location'] == 'http://localhost/latest'
+
+    with app.app_context():
+        # Nothing fetched within the request
+        assert RefreshJob.query.one().status == PENDING
+        assert get_feedlist_for_dropdown(user_id=1) == []
+
+        assert process_pending_jobs(app) == 1
+
+        assert RefreshJob.query.one().status == DONE
+        assert [feed.title for feed in Users.query.get(1).feeds] == ['Test feed']
+        assert Item.query.count() == 1
+
+    # The next page picks up the finished job and reloads the feed list of the navbar
+    assert b'href="/single/1"' in client.get('/latest').data
+
+
+def test_failed_job_is_shown_once(client, auth, app):
+    auth.login()
+    client.post('/add_feed', data={'xml_href': RSS})
+    client.post('/add_feed', data={'xml_href': RSS})
+
+    with app.app_context():
+        process_pending_jobs(app)
+        assert [job.status for job in RefreshJob.query.order_by(RefreshJob.id)] == [DONE, FAILED]
+
+    assert b'Feed was already added!' in client.get('/latest').data
+    assert b'Feed was already added!' not in client.get('/latest').data
+
+
+def test_failed_item_load_leaves_no_subscription(client, auth, app, monkeypatch):
+
+    def failing_update(feed_id, feed_dict):
+        raise OSError('Disk full')
+
+    monkeypatch.setattr('rssbriefing.refresh_jobs.update_feed_db', failing_update)
+    auth.login()
+    client.post('/add_feed', data={'xml_href': RSS})
+
+    with app.app_context():
+        process_pending_jobs(app)
+
+        assert RefreshJob.query.one().status == FAILED
+        assert Feed.query.count() == 0
+        assert Users.query.get(1).feeds == []
+
+    # The feed can be added again once the error is gone
+    assert b'Feed could not be loaded: Disk full' in client.get('/latest').data
+    monkeypatch.undo()
+    client.post('/add_feed', data={'xml_href': RSS})
+
+    with app.app_context():
+        process_pending_jobs(app)
+        assert Item.query.count() == 1
+
+
+def test_refresh_is_queued_once(client, auth, app):
+    auth.login()
+    client.post('/add_feed', data={'xml_href': RSS})
+
+    with app.app_context():
+        process_pending_jobs(app)
+
+    for _ in range(2):
+        response = client.get('/single/1?refresh=1')
+        assert response.headers['Location'] == 'http://localhost/single/1'
+
+    assert b'Refreshing...' in client.get('/single/1').data
+
+    with app.app_context():
+        assert RefreshJob.query.filter_by(kind='refresh', status=PENDING).count() == 1
+
+        process_pending_jobs(app)
+        assert RefreshJob.query.filter_by(kind='refresh').one().status == DONE
+
+
+def test_claim_and_requeue(app):
+    with app.app_context():
+        job_id = enqueue_add_feed(RSS, user_id=1).id
+
+        assert claim_next_job().id == job_id
+        assert claim_next_job() is None
+
+        # A job of a worker which died while running it is claimed again after the timeout
+        assert requeue_stale_jobs(timeout=60) == 0
+        RefreshJob.query.get(job_id).started = datetime.utcnow() - timedelta(minutes=5)
+        db.session.commit()
+
+        assert requeue_stale_jobs(timeout=60) == 1
+        assert claim_next_job().status == RUNNING
+
+
+def test_feedlist_is_reloaded_after_subscription_by_worker(client, auth, app):
+    auth.login()
+    dropdown_entry = b'href="/single/1"'
+
+    assert dropdown_entry not in client.get('/latest').data
+
+    # Subscription by the refresh worker, another process which can't reach the cache of the web app
+    with app.app_context():
+        user = Users.query.get(1)
+        user.feeds.append(Feed(title='Test feed', href=RSS))
+        db.session.add(RefreshJob(kind=ADD_FEED, href=RSS, user_id=1, status=DONE))
+        db.session.commit()
+
+    # Cached feed list until a page picks up the finished job
+    assert dropdown_entry not in client.get('/how_it_works').data
+    assert dropdown_entry in client.get('/latest').data
+    assert dropdown_entry in client.get('/how_it_works').data
+
+    client.post('/delete_feed', data={'FormControlSelect': 'Test feed'})
+    assert dropdown_entry not in client.get('/how_it_works').data
+
+    with app.app_context():
+        assert get_feedlist_for_dropdown(user_id=1) == []
+
+
+def test_feedlist_is_reloaded_by_other_web_processes(client, auth, app):
+    auth.login()
+    dropdown_entry = b'href="/single/1"'
+
+    with app.app_context():
+        user = Users.query.get(1)
+        user.feeds.append(Feed(title='Test feed', href=RSS))
+        db.session.commit()
+
+    # Second web process on the same db, with its own cache and the same session cookie
+    other_app = create_app({key: app.config[key] for key in ('TESTING', 'SECRET_KEY', 'SQLALCHEMY_DATABASE_URI')})
+    other_client = other_app.test_client()
+    session_cookie = next(cookie for cookie in client.cookie_jar if cookie.name == 'session')
+    other_client.set_cookie('localhost', 'session', session_cookie.value)
+
+    assert dropdown_entry in other_client.get('/how_it_works').data
+
+    client.post('/delete_feed', data={'FormControlSelect': 'Test feed'})
+    session_cookie = next(cookie for cookie in client.cookie_jar if cookie.name == 'session')
+    other_client.set_cookie('localhost', 'session', session_cookie.value)
+
+    assert dropdown_entry not in other_client.get('/how_it_works').data
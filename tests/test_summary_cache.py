@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+from rssbriefing import db
+from rssbriefing.briefing_model import summary_cache
+from rssbriefing.models import SummaryCache
+
+
+def test_normalize_url():
+    assert summary_cache.normalize_url('HTTPS://Example.com/a?utm_source=rss&b=2&a=1#top') == \
+        'https://example.com/a?a=1&b=2'
+    assert summary_cache.normalize_url('https://example.com') == 'https://example.com/'
+
+
+def test_store_and_lookup(app):
+    url = summary_cache.normalize_url('https://example.com/article')
+
+    with app.app_context():
+        summary_cache.store_summary(url, 'text', 'v1', 'summary')
+        summary_cache.store_summary(url, 'new text', 'v1', 'new summary')
+
+        entries = summary_cache.get_cache_entries([url, 'https://example.com/missing'])
+        assert list(entries) == [url]
+
+        entry = entries[url]
+        assert entry.summary == 'new summary'
+        assert summary_cache.is_fresh(entry, 'v1')
+        assert not summary_cache.is_fresh(entry, 'v2')
+        assert not summary_cache.is_fresh(entry, 'v1', now=datetime.utcnow() + timedelta(days=1))
+        assert summary_cache.matches_text(entry, 'v1', 'new text')
+        assert not summary_cache.matches_text(entry, 'v1', 'text')
+
+
+def test_evict(app):
+    now = datetime.utcnow()
+
+    with app.app_context():
+        for idx in range(5):
+            db.session.add(SummaryCache(url=f'https://example.com/{idx}', text_hash='', model_version='v1',
+                                        checked=now, last_used=now - timedelta(days=idx)))
+        db.session.commit()
+
+        assert summary_cache.evict(max_age_days=3.5, max_entries=2) == 3
+        assert {entry.url for entry in SummaryCache.query.all()} == {'https://example.com/0',
+                                                                     'https://example.com/1'}
@@ -0,0 +1,42 @@
+import pytest
+
+# The topic model needs the optional model dependencies
+gensim = pytest.importorskip('gensim')
+pytest.importorskip('spacy')
+
+from gensim.corpora import Dictionary  # noqa: E402
+
+from rssbriefing.briefing_model.topic_modeling import update_model  # noqa: E402
+from rssbriefing.briefing_model.data_structures import TopicModel, models_dict  # noqa: E402
+
+DOCS = [['bank', 'rate', 'inflation', 'market'], ['election', 'vote', 'party', 'poll'],
+        ['bank', 'market', 'stock', 'rate'], ['vote', 'election', 'campaign', 'party']] * 5
+
+
+@pytest.mark.parametrize('backend', ['lda', 'lda_multicore'])
+def test_update_model(backend):
+    dictionary = Dictionary(DOCS)
+    bow_corpus = [dictionary.doc2bow(doc) for doc in DOCS]
+
+    backend_kwargs = dict(workers=1) if backend == 'lda_multicore' else {}
+    model = models_dict[backend](corpus=bow_corpus, id2word=dictionary, num_topics=2, passes=1, **backend_kwargs)
+    documents = model.state.numdocs
+
+    update_model(model, bow_corpus[:4], backend, decay=0.5, passes=2)
+
+    assert model.state.numdocs > documents
+
+
+def test_store_keeps_dictionary_per_version(tmp_path):
+    store = TopicModel(path=str(tmp_path))
+    versions = []
+
+    for docs in (DOCS, DOCS + [['weather', 'storm', 'rain', 'flood']] * 5):
+        dictionary = Dictionary(docs)
+        model = models_dict['lda'](corpus=[dictionary.doc2bow(doc) for doc in docs], id2word=dictionary,
+                                   num_topics=2, passes=1)
+        versions.append(store.save(model, dictionary, dict(corpus_size=len(docs))))
+
+    assert 'storm' not in store.load_dictionary(versions[0]).token2id
+    assert 'storm' in store.load_dictionary().token2id
+    assert store.load_metadata()['version'] == versions[1]